@@ -1 +1 @@
-from .array3710 import Load, Program, ProgramStep
\ No newline at end of file
+from .array3710 import Load, Program, ProgramStep, StatusSnapshot
\ No newline at end of file
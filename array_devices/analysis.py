@@ -0,0 +1,298 @@
+"""
+Vectorized post-processing of recorded telemetry.
+
+Recorded status samples are loaded into columnar NumPy arrays (a Recording),
+and every conversion and statistic below works on whole columns at once.
+
+Requires NumPy.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import os
+
+import numpy as np
+
+from .array3710 import Load, Program
+from .capture import CaptureFormat, DIRECTION_RX
+from .telemetry import SAMPLE_FIELDS
+
+__author__ = 'Joe Sacher'
+
+# Column types of recorded samples, in load units
+SAMPLE_DTYPE = np.dtype([(str('timestamp'), '<f8'),
+                         (str('address'), 'u1'),
+                         (str('current'), '<u2'),
+                         (str('voltage'), '<u4'),
+                         (str('power'), '<u2'),
+                         (str('max_current'), '<u2'),
+                         (str('max_power'), '<u2'),
+                         (str('resistance'), '<u2'),
+                         (str('state'), 'u1')])
+
+# Divide load units by these to get Amps, Volts, Watts and Ohms
+UNIT_DIVIDES = {'current': 1000,
+                'voltage': 1000,
+                'power': 10,
+                'max_current': 1000,
+                'max_power': 10,
+                'resistance': 100}
+
+# Capture records, as CaptureFormat.STRUCT_RECORD, with read values response frame decoded
+_CAPTURE_DTYPE = np.dtype([(str('timestamp'), '<f8'),
+                           (str('bus_id'), '<u2'),
+                           (str('direction'), 'u1'),
+                           (str('length'), 'u1'),
+                           (str('frame'), 'u1', (Load.FRAME_LENGTH,)),
+                           (str('pad'), 'V2')])
+# Load.STRUCT_READ_VALUES_IN
+_FRAME_DTYPE = np.dtype([(str('start'), 'u1'),
+                         (str('address'), 'u1'),
+                         (str('command'), 'u1'),
+                         (str('current'), '<u2'),
+                         (str('voltage'), '<u4'),
+                         (str('power'), '<u2'),
+                         (str('max_current'), '<u2'),
+                         (str('max_power'), '<u2'),
+                         (str('resistance'), '<u2'),
+                         (str('state'), 'u1'),
+                         (str('reserved'), 'V7'),
+                         (str('checksum'), 'u1')])
+
+StepSummary = collections.namedtuple('StepSummary', 'start end count mean minimum maximum std')
+
+
+class Recording(object):
+    """
+    Columnar status samples.  Each field of StatusSample is a NumPy array,
+    ex: recording.voltage, in load units.
+    """
+
+    def __init__(self, samples):
+        """
+        :param samples: structured array of SAMPLE_DTYPE
+        :return: None
+        """
+        self.samples = np.asarray(samples, dtype=SAMPLE_DTYPE)
+
+    @classmethod
+    def from_samples(cls, samples):
+        """
+        :param samples: Iterable of StatusSample
+        """
+        return cls(np.array([tuple(sample) for sample in samples], dtype=SAMPLE_DTYPE))
+
+    @classmethod
+    def from_capture(cls, path, bus_id=None):
+        """
+        Decodes every valid read values response in a capture file,
+        without a Python loop over records.
+
+        :param path: Capture file written by capture.CaptureWriter
+        :param bus_id: Only use records of this bus, if given
+        """
+        # A partially written last record is ignored.
+        count = (os.path.getsize(path) - CaptureFormat.HEADER_SIZE) // CaptureFormat.RECORD_SIZE
+        if count <= 0:
+            return cls(np.empty(0, dtype=SAMPLE_DTYPE))
+        records = np.memmap(path, dtype=_CAPTURE_DTYPE, mode='r', offset=CaptureFormat.HEADER_SIZE, shape=(count,))
+        mask = (records['direction'] == DIRECTION_RX) & (records['length'] == Load.FRAME_LENGTH)
+        if bus_id is not None:
+            mask &= records['bus_id'] == bus_id
+        frames = records['frame'][mask]
+        checksum_ok = (frames[:, :-1].sum(axis=1, dtype=np.uint32) % 256) == frames[:, -1]
+        decoded = np.ascontiguousarray(frames).view(_FRAME_DTYPE).reshape(-1)
+        valid = checksum_ok & (decoded['command'] == Load.CMD_READ_VALUES) & (decoded['start'] == 0xAA)
+        decoded = decoded[valid]
+        samples = np.empty(len(decoded), dtype=SAMPLE_DTYPE)
+        samples['timestamp'] = records['timestamp'][mask][valid]
+        for name in SAMPLE_FIELDS[1:]:
+            samples[name] = decoded[name]
+        return cls(samples)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getattr__(self, name):
+        if name in SAMPLE_FIELDS:
+            return self.samples[name]
+        raise AttributeError(name)
+
+    @property
+    def addresses(self):
+        return np.unique(self.samples['address'])
+
+    def select(self, address=None, start=None, end=None):
+        """
+        Samples of one load and/or time range.
+
+        :return: Recording
+        """
+        mask = np.ones(len(self.samples), dtype=bool)
+        if address is not None:
+            mask &= self.samples['address'] == address
+        if start is not None:
+            mask &= self.samples['timestamp'] >= start
+        if end is not None:
+            mask &= self.samples['timestamp'] < end
+        return Recording(self.samples[mask])
+
+    def by_load(self):
+        """
+        :return: dict of address -> Recording
+        """
+        return dict((int(address), self.select(address)) for address in self.addresses)
+
+    def engineering(self, name):
+        """
+        Column in Amps, Volts, Watts or Ohms, as float64.
+
+        :param name: 'current', 'voltage', 'power', 'max_current', 'max_power' or 'resistance'
+        """
+        return self.samples[name] / float(UNIT_DIVIDES[name])
+
+    def state_bit(self, bit):
+        """
+        Boolean column of a state flag, ex: telemetry.STATE_LOAD_ON
+        """
+        return (self.samples['state'] & bit) != 0
+
+
+def uniform_grid(start, end, interval):
+    count = int(np.floor((end - start) / interval + 1e-9)) + 1
+    return start + np.arange(count) * interval
+
+
+def resample(recording, name, grid, method='linear'):
+    """
+    Values of one load's column, in engineering units, on a time grid.
+
+    :param recording: Recording of one load
+    :param name: Column name
+    :param grid: Times to resample at, ex: from uniform_grid
+    :param method: 'linear' interpolation or 'hold' last sample
+    :return: float64 array, NaN outside recorded time
+    """
+    times = recording.timestamp
+    values = recording.engineering(name)
+    grid = np.asarray(grid, dtype=np.float64)
+    if not len(times):
+        return np.full(len(grid), np.nan)
+    if method == 'linear':
+        result = np.interp(grid, times, values)
+    elif method == 'hold':
+        ind = np.searchsorted(times, grid, side='right') - 1
+        result = values[np.clip(ind, 0, len(values) - 1)]
+    else:
+        raise ValueError("Unknown resample method {}".format(method))
+    result[(grid < times[0]) | (grid > times[-1])] = np.nan
+    return result
+
+
+def ripple(timestamps, values, window):
+    """
+    Peak to peak and RMS ripple in consecutive time windows.
+
+    :param timestamps: Sample times
+    :param values: Sample values, ex: recording.engineering('voltage')
+    :param window: Window length in seconds
+    :return: (window start times, peak to peak, RMS about window mean)
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        empty = np.empty(0)
+        return empty, empty, empty
+    bins = np.floor((timestamps - timestamps[0]) / window).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    counts = np.diff(np.r_[starts, len(values)])
+    peak_to_peak = np.maximum.reduceat(values, starts) - np.minimum.reduceat(values, starts)
+    means = np.add.reduceat(values, starts) / counts
+    squares = np.add.reduceat(values * values, starts) / counts
+    rms = np.sqrt(np.maximum(squares - means * means, 0))
+    return timestamps[0] + bins[starts] * window, peak_to_peak, rms
+
+
+def efficiency(input_recording, output_recordings, grid, use_vi=True):
+    """
+    Efficiency of a converter measured by paired loads, output power / input power.
+
+    :param input_recording: Recording of load on converter input side
+    :param output_recordings: Recording, or list of Recordings for several outputs
+    :param grid: Common time grid
+    :param use_vi: True to compute power as V * I (finer resolution than reported power)
+    :return: float64 array on grid, NaN where input power is 0 or unknown
+    """
+    if isinstance(output_recordings, Recording):
+        output_recordings = [output_recordings]
+
+    def power(recording):
+        if use_vi:
+            return resample(recording, 'voltage', grid) * resample(recording, 'current', grid)
+        return resample(recording, 'power', grid)
+
+    input_power = power(input_recording)
+    output_power = sum(power(recording) for recording in output_recordings)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = output_power / input_power
+    result[~(input_power > 0)] = np.nan
+    return result
+
+
+def step_boundaries(program, start, clock_factor=1.0, load=None):
+    """
+    Start and end times of program steps.
+
+    A Load with clock_factor set already corrects step durations it sends,
+    so pass that load instead of a clock_factor, or the correction is applied
+    twice.  Its factor is used with the whole second durations actually sent.
+
+    :param program: Program, or list of step durations in seconds
+    :param start: Time program was started, in recording time
+    :param clock_factor: Real step time / programmed step time of a load that
+                         was sent uncorrected durations (Load.clock_factor 1.0)
+    :param load: Load that sent the program, instead of clock_factor
+    :return: array of step boundary times, one longer than number of steps
+    """
+    if isinstance(program, Program):
+        durations = [step.duration for step in program.steps]
+    else:
+        durations = list(program)
+    if load is not None:
+        clock_factor = load.clock_factor
+        durations = [int(round(duration / clock_factor)) for duration in durations]
+    return start + np.r_[0, np.cumsum(durations)] * clock_factor
+
+
+def step_summaries(recording, name, boundaries):
+    """
+    Statistics of a column for every step between boundaries.
+
+    :param recording: Recording of one load
+    :param name: Column name
+    :param boundaries: Step boundary times, ex: from step_boundaries
+    :return: list of StepSummary in engineering units, None values for steps without samples
+    """
+    times = recording.timestamp
+    values = recording.engineering(name)
+    boundaries = np.asarray(boundaries, dtype=np.float64)
+    edges = np.searchsorted(times, boundaries, side='left')
+    counts = np.diff(edges)
+    sums = np.diff(np.r_[0, np.cumsum(values)][edges])
+    squares = np.diff(np.r_[0, np.cumsum(values * values)][edges])
+    # Padding keeps the last edge a valid index, reduceat then covers values[edges[i]:edges[i + 1]]
+    padded = np.r_[values, 0]
+    maximums = np.maximum.reduceat(padded, edges)[:-1]
+    minimums = np.minimum.reduceat(padded, edges)[:-1]
+    summaries = []
+    for ind, count in enumerate(counts):
+        if not count:
+            summaries.append(StepSummary(boundaries[ind], boundaries[ind + 1], 0, None, None, None, None))
+            continue
+        mean = sums[ind] / count
+        std = np.sqrt(max(squares[ind] / count - mean * mean, 0))
+        summaries.append(StepSummary(boundaries[ind], boundaries[ind + 1], int(count),
+                                     mean, minimums[ind], maximums[ind], std))
+    return summaries
@@ -6,6 +6,9 @@ import struct
 import ctypes
 import binascii
 import sys
+import threading
+import time
+import weakref
 
 __author__ = 'Joe Sacher'
 
@@ -13,6 +16,80 @@ __author__ = 'Joe Sacher'
 PY2 = sys.version_info[0] == 2
 PY3 = sys.version_info[0] == 3
 
+# Monotonic clock for timestamps and deadlines, falling back to wall clock on Python 2.
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+class _NoSpan(object):
+    """
+    Span used when tracing is off, see tracing.Tracer
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def set(self, **args):
+        pass
+
+NO_SPAN = _NoSpan()
+
+
+class _NoLock(object):
+    """
+    Transaction lock of connections that keep transactions apart themselves
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NO_LOCK = _NoLock()
+
+# Transaction lock of each serial connection, shared by all loads on it
+_transaction_locks = weakref.WeakKeyDictionary()
+_transaction_locks_lock = threading.Lock()
+
+
+def transaction_lock(serial_connection):
+    """
+    Lock held by Load for each frame, or frame and response, on a serial connection,
+    so loads on one connection can be used from several threads.
+
+    Connections with a true serializes_transactions attribute, like
+    scheduler.BusScheduler, return each response to the thread that wrote
+    the request, and get no lock, so a safety frame is never held behind
+    a transaction of another thread.
+
+    :param serial_connection: Serial connection
+    :return: context manager
+    """
+    if getattr(serial_connection, 'serializes_transactions', False):
+        return _NO_LOCK
+    with _transaction_locks_lock:
+        lock = _transaction_locks.get(serial_connection)
+        if lock is None:
+            lock = threading.RLock()
+            _transaction_locks[serial_connection] = lock
+    return lock
+
+
+class _FrameBuffers(threading.local):
+    """
+    Frame buffers of a Load, one pair per thread
+    """
+
+    def __init__(self, frame_length):
+        # out_buffer for building data to send, in_buffer for consuming responses.
+        self.out_buffer = ctypes.create_string_buffer(frame_length)
+        self.in_buffer = ctypes.create_string_buffer(frame_length)
+
 
 def byte2int(value):
     """
@@ -59,7 +136,7 @@ class ProgramStep(object):
     def setting(self, value):
         prog_type = self.__program.program_type
         if 0 <= value <= self.MAX_SETTINGS[prog_type]:
-            self._setting = value * self.SETTING_DIVIDES[prog_type]
+            self._setting = int(round(value * self.SETTING_DIVIDES[prog_type]))
         else:
             raise ValueError("Setting outside of valid range: 0-{} {}".format(
                 self.MAX_SETTINGS[prog_type], self.SETTING_UNITS[prog_type]))
@@ -85,6 +162,20 @@ class ProgramStep(object):
         """
         return self._setting, self._duration
 
+    def encoded_data(self, clock_factor=1.0):
+        """
+        Raw data with duration corrected for a load whose program clock
+        runs clock_factor times as long as programmed.
+        Ex: clock_factor 0.7, 10 second step is encoded as 14 seconds.
+
+        :param clock_factor: Real step time / programmed step time of the load
+        :return: (setting, duration)
+        """
+        duration = int(round(self._duration / clock_factor))
+        if not 0 < duration <= 60000:
+            raise ValueError("Corrected duration {} should be between 1-60000 seconds".format(duration))
+        return self._setting, duration
+
 
 class Program(object):
     """
@@ -133,7 +224,7 @@ class Program(object):
         for step in self._prog_steps:
             yield(step)
 
-    def partial_steps_data(self, start=0):
+    def partial_steps_data(self, start=0, clock_factor=1.0):
         """
         Iterates 5 steps from start position and
         provides tuple for packing into buffer.
@@ -141,13 +232,14 @@ class Program(object):
         returns (0, 0) if stpe doesn't exist.
 
         :param start: Position to start from (typically 0 or 5)
+        :param clock_factor: Program clock factor of load, see ProgramStep.encoded_data
         :yield: (setting, duration)
         """
         cnt = 0
         if len(self._prog_steps) >= start:
             # yields actual steps for encoding
             for step in self._prog_steps[start:start+5]:
-                yield((step.raw_data))
+                yield((step.encoded_data(clock_factor)))
                 cnt += 1
         while cnt < 5:
             yield((0, 0))
@@ -171,27 +263,84 @@ class Program(object):
         """
         del self._prog_steps[position]
 
-    def load_buffer_one_to_five(self, out_buffer):
+    def load_buffer_one_to_five(self, out_buffer, clock_factor=1.0):
         """
         Loads first program buffer (0x93) with everything but
         first three bytes and checksum
         """
         struct.pack_into(b"< 2B", out_buffer, 3, self._program_type, len(self._prog_steps))
         offset = 5
-        for ind, step in enumerate(self.partial_steps_data(0)):
+        for ind, step in enumerate(self.partial_steps_data(0, clock_factor)):
             struct.pack_into(b"< 2H", out_buffer, offset + ind*4, step[0], step[1])
 
-    def load_buffer_six_to_ten(self, out_buffer):
+    def load_buffer_six_to_ten(self, out_buffer, clock_factor=1.0):
         """
         Loads second program buffer (0x94) with everything but
         first three bytes and checksum
         """
         offset = 3
-        for ind, step in enumerate(self.partial_steps_data(5)):
+        for ind, step in enumerate(self.partial_steps_data(5, clock_factor)):
             struct.pack_into(b"< 2H", out_buffer, offset + ind*4, step[0], step[1])
         struct.pack_into(b"< B x", out_buffer, 23, self._program_mode)
 
 
+class StatusSnapshot(object):
+    """
+    Values of one read values (0x91) response, as returned by Load.update_status.
+
+    Values are in load units (mA, mV, 0.1 W, 0.01 ohms) and state is the
+    output state byte.  Snapshots can't be changed, so they can be shared
+    between threads and kept as history without copying.
+    """
+    __slots__ = ('timestamp', 'current', 'voltage', 'power', 'max_current', 'max_power', 'resistance', 'state')
+
+    def __init__(self, timestamp, current, voltage, power, max_current, max_power, resistance, state):
+        """
+        :param timestamp: monotonic time of response, or None if never read
+        :return: None
+        """
+        for name, value in zip(self.__slots__, (timestamp, current, voltage, power,
+                                                max_current, max_power, resistance, state)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StatusSnapshot is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError("StatusSnapshot is read-only")
+
+    def __reduce__(self):
+        return self.__class__, tuple(getattr(self, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return "StatusSnapshot({})".format(", ".join("{}={!r}".format(name, getattr(self, name))
+                                                      for name in self.__slots__))
+
+    @property
+    def remote_control(self):
+        return (self.state & 0b00000001) > 0
+
+    @property
+    def load_on(self):
+        return (self.state & 0b00000010) > 0
+
+    @property
+    def wrong_polarity(self):
+        return (self.state & 0b00000100) > 0
+
+    @property
+    def excessive_temp(self):
+        return (self.state & 0b00001000) > 0
+
+    @property
+    def excessive_voltage(self):
+        return (self.state & 0b00010000) > 0
+
+    @property
+    def excessive_power(self):
+        return (self.state & 0b00100000) > 0
+
+
 class Load(object):
     """
     Handles remote control of Array 3710A DC Electronic Load.
@@ -199,6 +348,9 @@ class Load(object):
     """
 
     DEBUG_MODE = False
+    # tracing.Tracer recording spans of every operation, or None.
+    # Set on Load to trace all loads, or on one load.
+    tracer = None
 
     # Packet command values
     CMD_SET_PARAMETERS = 0x90
@@ -215,6 +367,28 @@ class Load(object):
 
     FRAME_LENGTH = 26
 
+    # Setpoints as (multiplier to load units, max in load units, range error)
+    # Ex: current 10A * 1000 -> 10000 mA, max 30000 mA
+    SETPOINTS = {
+        'current': (1000, 30000, "Load Current should be between 0-30A"),
+        'power': (10, 2000, "Load Power should be between 0-200 W"),
+        'resistance': (100, 50000, "Load Resistance should be between 0-500 ohms"),
+        'max_current': (1000, 30000, "Max Current should be between 0-30A"),
+        'max_power': (10, 2000, "Max Power should be between 0-200W"),
+    }
+    # Setpoint name of each SET_TYPE
+    SET_TYPE_NAMES = {
+        SET_TYPE_CURRENT: 'current',
+        SET_TYPE_POWER: 'power',
+        SET_TYPE_RESISTANCE: 'resistance',
+    }
+
+    # Span names of frames accepted by send_frame
+    FRAME_SPANS = {
+        CMD_SET_PARAMETERS: 'set_parameters',
+        CMD_LOAD_STATE: 'load_state',
+    }
+
     # Description of data structures for various packet types
     STRUCT_FRONT = struct.Struct(b'< 3B 23x')
     STRUCT_SET_PARAMETERS = struct.Struct(b'< 2H 2B H 14x')
@@ -232,19 +406,21 @@ class Load(object):
     OFFSET_PAYLOAD = 3
     OFFSET_CHECKSUM = 25
 
-    def __init__(self, address, serial_connection, print_errors=True):
+    def __init__(self, address, serial_connection, print_errors=True, lazy=False):
         """
         Require passing in serial_connection, because multiple Loads can exist
         with different addresses on a single serial port.
 
         :param address: Load address (0x00-0xFE)
         :param serial_connection: Serial Connection from serial.Serial()
+        :param lazy: True to skip initial update_status, so no IO is done.
+                     See rack.connect for fetching status of many loads.
         :return: None
         """
         # Serial Comm Packets are all 26 byte frames.
-        # out_buffer for building data to send, in_buffer for consuming responses.
-        self.__out_buffer = ctypes.create_string_buffer(self.FRAME_LENGTH)
-        self.__in_buffer = ctypes.create_string_buffer(self.FRAME_LENGTH)
+        # Buffers are per thread, so a load can be used from several threads,
+        # ex: a script and a watchdog.ProtectionWatchdog.  See transaction_lock.
+        self.__buffers = _FrameBuffers(self.FRAME_LENGTH)
 
         self.address = address
         self.serial = serial_connection
@@ -253,18 +429,17 @@ class Load(object):
         self._max_power = 2000
         self._load_mode = self.SET_TYPE_RESISTANCE
         self._load_value = 500
-        self._current = 0
-        self._power = 0
-        self._voltage = 0
-        self._resistance = 0
         self._remote_control = 0
         self._load_on = 0
-        self.wrong_polarity = 0
-        self.excessive_temp = 0
-        self.excessive_voltage = 0
-        self.excessive_power = 0
+        # Latest StatusSnapshot.  Replaced, never changed, by update_status.
+        self.status = StatusSnapshot(None, 0, 0, 0, self._max_current, self._max_power, 0, 0)
         self.print_errors = print_errors
-        self.update_status()
+        # calibration.CalibrationProfile correcting readings and setpoints, or None
+        self.calibration = None
+        # Real program step time / programmed step time, see clock.measure_clock_factor
+        self.clock_factor = 1.0
+        if not lazy:
+            self.update_status()
 
     # Note: Internally, all values are stored as integer values
     # in the format of the load interface.
@@ -274,6 +449,46 @@ class Load(object):
     #
     # Conversion is done on getter and setter methods.
 
+    @classmethod
+    def to_load_units(cls, setpoint, value):
+        """
+        Converts a setpoint from public units to load units, checking range.
+
+        :param setpoint: Name of setpoint in SETPOINTS
+        :param value: Value in Amps, Watts or Ohms
+        :return: int value in load units
+        """
+        multiplier, max_value, range_error = cls.SETPOINTS[setpoint]
+        new_val = int(round(value * multiplier))
+        if not 0 <= new_val <= max_value:
+            raise ValueError(range_error)
+        return new_val
+
+    def setpoint_units(self, setpoint, value):
+        """
+        Converts a setpoint to load units, applying calibration of load.
+        Requested value is range checked, corrected value is limited to
+        the range the load accepts.
+
+        :param setpoint: 'current', 'power' or 'resistance'
+        :param value: Value in Amps, Watts or Ohms
+        :return: int value in load units
+        """
+        new_val = self.to_load_units(setpoint, value)
+        if self.calibration is None:
+            return new_val
+        multiplier, max_value, _ = self.SETPOINTS[setpoint]
+        new_val = int(round(self.calibration.setpoint(setpoint, value) * multiplier))
+        return min(max(new_val, 0), max_value)
+
+    def __reading(self, name, value):
+        """
+        Applies calibration to a reading in Amps, Volts, Watts or Ohms.
+        """
+        if self.calibration is None:
+            return value
+        return self.calibration.reading(name, value)
+
     @property
     def max_current(self):
         """
@@ -284,10 +499,7 @@ class Load(object):
 
     @max_current.setter
     def max_current(self, current_amps):
-        new_val = int(round(current_amps * 1000, 0))
-        if not 0 <= new_val <= 30000:
-            raise ValueError("Max Current should be between 0-30A")
-        self._max_current = new_val
+        self._max_current = self.to_load_units('max_current', current_amps)
         self.__set_parameters()
 
     @property
@@ -300,10 +512,7 @@ class Load(object):
 
     @max_power.setter
     def max_power(self, power_watts):
-        new_val = int(round(power_watts * 10, 0))
-        if not 0 <= new_val <= 2000:
-            raise ValueError("Max Power should be between 0-200W")
-        self._max_power = new_val
+        self._max_power = self.to_load_units('max_power', power_watts)
         self.__set_parameters()
 
     def set_load_resistance(self, resistance):
@@ -314,9 +523,7 @@ class Load(object):
         :param resistance: Load Resistance in Ohms (0-500 ohms)
         :return: None
         """
-        new_val = int(round(resistance * 100))
-        if not 0 <= new_val <= 50000:
-            raise ValueError("Load Resistance should be between 0-500 ohms")
+        new_val = self.setpoint_units('resistance', resistance)
         self._load_mode = self.SET_TYPE_RESISTANCE
         self._load_value = new_val
         self.__set_parameters()
@@ -329,9 +536,7 @@ class Load(object):
         :param power_watts: Power in Watts (0-200)
         :return:
         """
-        new_val = int(round(power_watts * 10))
-        if not 0 <= new_val <= 2000:
-            raise ValueError("Load Power should be between 0-200 W")
+        new_val = self.setpoint_units('power', power_watts)
         self._load_mode = self.SET_TYPE_POWER
         self._load_value = new_val
         self.__set_parameters()
@@ -344,9 +549,7 @@ class Load(object):
         :param current_amps: Current in Amps (0-30A)
         :return: None
         """
-        new_val = int(round(current_amps * 1000))
-        if not 0 <= new_val <= 30000:
-            raise ValueError("Load Current should be between 0-30A")
+        new_val = self.setpoint_units('current', current_amps)
         self._load_mode = self.SET_TYPE_CURRENT
         self._load_value = new_val
         self.__set_parameters()
@@ -356,28 +559,56 @@ class Load(object):
         """
         Current value (in Amps) obtained during last update_status call.
         """
-        return self._current / 1000
+        return self.__reading('current', self.status.current / 1000)
 
     @property
     def power(self):
         """
         Power value (in Watts) obtained during last update_status call.
         """
-        return self._power / 10
+        return self.__reading('power', self.status.power / 10)
 
     @property
     def resistance(self):
         """
         Resistance value (in ohms) obtained during last update_status call.
         """
-        return self._resistance / 100
+        return self.__reading('resistance', self.status.resistance / 100)
 
     @property
     def voltage(self):
         """
         Voltage value (in Volts) obtained during last update_status call.
         """
-        return self._voltage / 1000
+        return self.__reading('voltage', self.status.voltage / 1000)
+
+    @property
+    def wrong_polarity(self):
+        """
+        Wrong polarity flag obtained during last update_status call.
+        """
+        return self.status.wrong_polarity
+
+    @property
+    def excessive_temp(self):
+        """
+        Excessive temperature flag obtained during last update_status call.
+        """
+        return self.status.excessive_temp
+
+    @property
+    def excessive_voltage(self):
+        """
+        Excessive voltage flag obtained during last update_status call.
+        """
+        return self.status.excessive_voltage
+
+    @property
+    def excessive_power(self):
+        """
+        Excessive power flag obtained during last update_status call.
+        """
+        return self.status.excessive_power
 
     @property
     def remote_control(self):
@@ -411,13 +642,101 @@ class Load(object):
             self._load_on = new_val
             self.__set_load_state()
 
+    def set_load_state(self, remote_control, load_on):
+        """
+        Sets remote control and load enabled state with a single command.
+        Unlike the properties, the command is sent even if state is unchanged.
+
+        :param remote_control: Remote control enabled
+        :param load_on: Load enabled
+        :return: None
+        """
+        self._remote_control = 1 if remote_control else 0
+        self._load_on = 1 if load_on else 0
+        self.__set_load_state()
+
+    @classmethod
+    def build_frame(cls, address, command, fill=None):
+        """
+        Builds a complete frame without a Load object, for sending
+        pre-encoded frames.
+
+        :param address: Load address
+        :param command: Command Code
+        :param fill: Called with buffer to pack payload, ex: program.load_buffer_one_to_five
+        :return: 26 byte string
+        """
+        out_buffer = ctypes.create_string_buffer(cls.FRAME_LENGTH)
+        cls.STRUCT_FRONT.pack_into(out_buffer, cls.OFFSET_FRONT, 0xAA, address, command)
+        if fill is not None:
+            fill(out_buffer)
+        cls.STRUCT_CHECKSUM.pack_into(out_buffer, cls.OFFSET_CHECKSUM, cls.__get_checksum(out_buffer.raw))
+        return out_buffer.raw
+
+    def set_parameters_frame(self, load_mode, value, max_current=None, max_power=None):
+        """
+        Builds a 0x90 frame, by default with current max current and max power
+        of load, for sending later with send_frame.  Ex: precomputed ramp steps.
+
+        :param load_mode: SET_TYPE_CURRENT, SET_TYPE_POWER or SET_TYPE_RESISTANCE
+        :param value: Setpoint in load units, see to_load_units
+        :param max_current: Max current in load units, None to keep current one
+        :param max_power: Max power in load units, None to keep current one
+        :return: 26 byte string
+        """
+        if max_current is None:
+            max_current = self._max_current
+        if max_power is None:
+            max_power = self._max_power
+        return self.build_frame(self.address, self.CMD_SET_PARAMETERS, lambda out_buffer:
+                                self.STRUCT_SET_PARAMETERS.pack_into(out_buffer, self.OFFSET_PAYLOAD,
+                                                                     max_current, max_power,
+                                                                     self.address, load_mode, value))
+
+    def send_frame(self, frame):
+        """
+        Sends a pre-built 0x90 or 0x92 frame, without reading status.
+        Settings of load are updated from the frame, as if set by the
+        setters or set_load_state.
+
+        :param frame: 26 byte string, ex: from set_parameters_frame
+        :return: None
+        """
+        frame = bytes(frame)
+        if len(frame) != self.FRAME_LENGTH or byte2int(frame[1]) != self.address:
+            raise ValueError("Frame is not a {} byte frame to address {}".format(self.FRAME_LENGTH,
+                                                                                 self.address))
+        if not self.__is_valid_checksum(frame):
+            raise ValueError("Frame checksum is not valid")
+        command = byte2int(frame[2])
+        if command not in self.FRAME_SPANS:
+            raise ValueError("Only 0x90 and 0x92 frames can be sent")
+        with self.__span(self.FRAME_SPANS[command]):
+            self.__buffers.out_buffer.raw = frame
+            self.__send_buffer()
+            if command == self.CMD_SET_PARAMETERS:
+                (self._max_current, self._max_power, _, self._load_mode,
+                 self._load_value) = self.STRUCT_SET_PARAMETERS.unpack_from(frame, self.OFFSET_PAYLOAD)
+            else:
+                flags = self.STRUCT_LOAD_STATE.unpack_from(frame, self.OFFSET_PAYLOAD)[0]
+                self._remote_control = (flags >> 1) & 1
+                self._load_on = flags & 1
+
+    def __span(self, name, **args):
+        """
+        Span of an operation on this load, for tracing
+        """
+        if self.tracer is None:
+            return NO_SPAN
+        return self.tracer.span(name, self.serial, self.address, **args)
+
     def __set_buffer_start(self, command):
         """
         This sets the first three bytes and clears the other 23 bytes.
         :param command: Command Code to set
         :return: None
         """
-        self.STRUCT_FRONT.pack_into(self.__out_buffer, self.OFFSET_FRONT, 0xAA, self.address, command)
+        self.STRUCT_FRONT.pack_into(self.__buffers.out_buffer, self.OFFSET_FRONT, 0xAA, self.address, command)
 
     @staticmethod
     def __get_checksum(byte_str):
@@ -437,8 +756,8 @@ class Load(object):
         based on values in the buffer
         :return: None
         """
-        checksum = self.__get_checksum(self.__out_buffer.raw)
-        self.STRUCT_CHECKSUM.pack_into(self.__out_buffer, self.OFFSET_CHECKSUM, checksum)
+        checksum = self.__get_checksum(self.__buffers.out_buffer.raw)
+        self.STRUCT_CHECKSUM.pack_into(self.__buffers.out_buffer, self.OFFSET_CHECKSUM, checksum)
 
     def __is_valid_checksum(self, byte_str):
         """
@@ -453,38 +772,44 @@ class Load(object):
         Zeros out the in buffer
         :return: None
         """
-        self.__in_buffer.value = bytes(b'\0' * len(self.__in_buffer))
+        self.__buffers.in_buffer.value = bytes(b'\0' * len(self.__buffers.in_buffer))
 
     def __send_buffer(self):
         """
-        Sends the contents of self.__out_buffer to serial device
+        Sends the contents of self.__buffers.out_buffer to serial device
         :return: Number of bytes written
         """
-        bytes_written = self.serial.write(self.__out_buffer.raw)
+        with self.__span('write'), transaction_lock(self.serial):
+            bytes_written = self.serial.write(self.__buffers.out_buffer.raw)
         if self.DEBUG_MODE:
-            print("Wrote: '{}'".format(binascii.hexlify(self.__out_buffer.raw)))
-        if bytes_written != len(self.__out_buffer):
+            print("Wrote: '{}'".format(binascii.hexlify(self.__buffers.out_buffer.raw)))
+        if bytes_written != len(self.__buffers.out_buffer):
             raise IOError("{} bytes written for output buffer of size {}".format(bytes_written,
-                                                                                 len(self.__out_buffer)))
+                                                                                 len(self.__buffers.out_buffer)))
         return bytes_written
 
     def __send_receive_buffer(self):
         """
-        Performs a send of self.__out_buffer and then an immediate read into self.__in_buffer
+        Performs a send of self.__buffers.out_buffer and then an immediate read into self.__buffers.in_buffer
 
         :return: None
         """
         self.__clear_in_buffer()
-        self.__send_buffer()
-        read_string = self.serial.read(len(self.__in_buffer))
+        # Held from write to response, so no other thread's frame comes in between
+        with transaction_lock(self.serial):
+            self.__send_buffer()
+            with self.__span('wait_response'):
+                read_string = self.serial.read(len(self.__buffers.in_buffer))
         if self.DEBUG_MODE:
             print("Read: '{}'".format(binascii.hexlify(read_string)))
-        if len(read_string) != len(self.__in_buffer):
+        if len(read_string) != len(self.__buffers.in_buffer):
             raise IOError("{} bytes received for input buffer of size {}".format(len(read_string),
-                                                                                 len(self.__in_buffer)))
+                                                                                 len(self.__buffers.in_buffer)))
         if not self.__is_valid_checksum(read_string):
             raise IOError("Checksum validation failed on received data")
-        self.__in_buffer.value = read_string
+        if byte2int(read_string[1]) != self.address:
+            raise IOError("Response from address {}, expected {}".format(byte2int(read_string[1]), self.address))
+        self.__buffers.in_buffer.value = read_string
 
     def __set_parameters(self):
         """
@@ -493,15 +818,17 @@ class Load(object):
 
         :return: None
         """
-        self.__set_buffer_start(self.CMD_SET_PARAMETERS)
-        # Can I send 0xFF as address to not change it each time?
-        # Worry about writing to EEPROM or Flash with each address change.
-        # Would then implement a separate address only change function.
-        self.STRUCT_SET_PARAMETERS.pack_into(self.__out_buffer, self.OFFSET_PAYLOAD,
-                                             self._max_current, self._max_power, self.address,
-                                             self._load_mode, self._load_value)
-        self.__set_checksum()
-        self.__send_buffer()
+        with self.__span('set_parameters'):
+            with self.__span('encode'):
+                self.__set_buffer_start(self.CMD_SET_PARAMETERS)
+                # Can I send 0xFF as address to not change it each time?
+                # Worry about writing to EEPROM or Flash with each address change.
+                # Would then implement a separate address only change function.
+                self.STRUCT_SET_PARAMETERS.pack_into(self.__buffers.out_buffer, self.OFFSET_PAYLOAD,
+                                                     self._max_current, self._max_power, self.address,
+                                                     self._load_mode, self._load_value)
+                self.__set_checksum()
+            self.__send_buffer()
         self.update_status()
 
     def update_status(self, retry_count=2):
@@ -522,80 +849,87 @@ class Load(object):
           excessive_power
 
         :param retry_count: Number of times to ignore IOErrors and retry update
-        :return: None
+        :return: StatusSnapshot, also kept in status
         """
         # I think retry should be in here.
         # Throw exceptions in __update_status and handle here
-        cur_count = max(retry_count, 0)
-        while cur_count >= 0:
-            try:
-                self.__update_status()
-            except IOError as err:
-                if self.print_errors:
-                    print("IOError: {}".format(err))
-            else:
-                if not self.__is_valid_checksum(self.__in_buffer.raw):
+        with self.__span('update_status'):
+            cur_count = max(retry_count, 0)
+            attempt_name = 'read_values'
+            while cur_count >= 0:
+                try:
+                    with self.__span(attempt_name):
+                        self.__update_status()
+                except IOError as err:
                     if self.print_errors:
-                        raise IOError("Checksum validation failed.")
-                values = self.STRUCT_READ_VALUES_IN.unpack_from(self.__in_buffer, self.OFFSET_FRONT)
-                (self._current,
-                 self._voltage,
-                 self._power,
-                 self._max_current,
-                 self._max_power,
-                 self._resistance,
-                 output_state) = values[3:-1]
-
-                self._remote_control = (output_state & 0b00000001) > 0
-                self._load_on = (output_state & 0b00000010) > 0
-                self.wrong_polarity = (output_state & 0b00000100) > 0
-                self.excessive_temp = (output_state & 0b00001000) > 0
-                self.excessive_voltage = (output_state & 0b00010000) > 0
-                self.excessive_power = (output_state & 0b00100000) > 0
-                return None
-            cur_count -= 1
-        raise IOError("Retry count exceeded with serial IO.")
+                        print("IOError: {}".format(err))
+                else:
+                    with self.__span('decode'):
+                        if not self.__is_valid_checksum(self.__buffers.in_buffer.raw):
+                            if self.print_errors:
+                                raise IOError("Checksum validation failed.")
+                        values = self.STRUCT_READ_VALUES_IN.unpack_from(self.__buffers.in_buffer, self.OFFSET_FRONT)
+                        status = StatusSnapshot(monotonic(), *values[3:-1])
+                        # Settings sent with next 0x90 and 0x92 frames follow the load
+                        self._max_current = status.max_current
+                        self._max_power = status.max_power
+                        self._remote_control = int(status.remote_control)
+                        self._load_on = int(status.load_on)
+                        self.status = status
+                    return status
+                cur_count -= 1
+                attempt_name = 'retry'
+            raise IOError("Retry count exceeded with serial IO.")
 
     def __update_status(self):
-        self.__set_buffer_start(self.CMD_READ_VALUES)
-        self.STRUCT_READ_VALUES_OUT.pack_into(self.__out_buffer, 3)
-        self.__set_checksum()
+        with self.__span('encode'):
+            self.__set_buffer_start(self.CMD_READ_VALUES)
+            self.STRUCT_READ_VALUES_OUT.pack_into(self.__buffers.out_buffer, 3)
+            self.__set_checksum()
         self.__send_receive_buffer()
 
     def __set_load_state(self):
-        # Remote Control is bit 2
-        flags = self._remote_control << 1
-        # Load On is bit 1
-        flags |= self._load_on
-        self.__set_buffer_start(self.CMD_LOAD_STATE)
-        self.STRUCT_LOAD_STATE.pack_into(self.__out_buffer, self.OFFSET_PAYLOAD, flags)
-        self.__set_checksum()
-        self.__send_buffer()
+        with self.__span('load_state'):
+            with self.__span('encode'):
+                # Remote Control is bit 2
+                flags = self._remote_control << 1
+                # Load On is bit 1
+                flags |= self._load_on
+                self.__set_buffer_start(self.CMD_LOAD_STATE)
+                self.STRUCT_LOAD_STATE.pack_into(self.__buffers.out_buffer, self.OFFSET_PAYLOAD, flags)
+                self.__set_checksum()
+            self.__send_buffer()
 
     def set_program_sequence(self, array_program):
         """
         Sets program up in load.
+        Step durations are corrected by clock_factor of load.
+
         :param array_program: Populated Array3710Program object
         :return: None
         """
-        self.__set_buffer_start(self.CMD_DEFINE_PROG_1_5)
-        array_program.load_buffer_one_to_five(self.__out_buffer)
-        self.__set_checksum()
-        self.__send_buffer()
+        with self.__span('define_program'):
+            with self.__span('encode'):
+                self.__set_buffer_start(self.CMD_DEFINE_PROG_1_5)
+                array_program.load_buffer_one_to_five(self.__buffers.out_buffer, self.clock_factor)
+                self.__set_checksum()
+            self.__send_buffer()
 
-        self.__set_buffer_start(self.CMD_DEFINE_PROG_6_10)
-        array_program.load_buffer_six_to_ten(self.__out_buffer)
-        self.__set_checksum()
-        self.__send_buffer()
+            with self.__span('encode'):
+                self.__set_buffer_start(self.CMD_DEFINE_PROG_6_10)
+                array_program.load_buffer_six_to_ten(self.__buffers.out_buffer, self.clock_factor)
+                self.__set_checksum()
+            self.__send_buffer()
 
     def start_program(self, turn_on_load=True):
         """
         Starts running programmed test sequence
         :return: None
         """
-        self.__set_buffer_start(self.CMD_START_PROG)
-        self.__set_checksum()
-        self.__send_buffer()
+        with self.__span('start_program'):
+            self.__set_buffer_start(self.CMD_START_PROG)
+            self.__set_checksum()
+            self.__send_buffer()
         # Turn on Load if not on
         if turn_on_load and not self.load_on:
             self.load_on = True
@@ -605,9 +939,10 @@ class Load(object):
         Stops running programmed test sequence
         :return: None
         """
-        self.__set_buffer_start(self.CMD_STOP_PROG)
-        self.__set_checksum()
-        self.__send_buffer()
+        with self.__span('stop_program'):
+            self.__set_buffer_start(self.CMD_STOP_PROG)
+            self.__set_checksum()
+            self.__send_buffer()
         if turn_off_load and self.load_on:
             self.load_on = False
 
@@ -699,8 +1034,6 @@ class SerialTester(object):
 
 if __name__ == '__main__':
 
-    import time
-
     serial_conn = SerialTester('COM4', 9600, timeout=1)
     test_load = Load(0, serial_conn)
     test_load.remote_control = True
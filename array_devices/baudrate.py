@@ -0,0 +1,263 @@
+"""
+Baud rate characterization.
+
+Measures error rate and status command throughput of loads for a range of
+PC baud rates and inter-frame gaps, and caches the best operating point per
+serial adapter, so buses can be opened at their measured maximum.
+
+Only status reads (0x91) are used for measurement, because they are the
+only commands with a response to validate, and they don't change load settings.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import json
+import os
+import threading
+import time
+
+from .array3710 import Load, monotonic
+from .tracing import span
+
+__author__ = 'Joe Sacher'
+
+Measurement = collections.namedtuple(
+    'Measurement', 'port address baudrate frame_gap commands errors elapsed')
+
+
+def error_rate(measurement):
+    if not measurement.commands:
+        return 1.0
+    return measurement.errors / measurement.commands
+
+
+def commands_per_second(measurement):
+    if not measurement.elapsed:
+        return 0.0
+    return measurement.commands / measurement.elapsed
+
+
+class PacedSerial(object):
+    """
+    Wraps a serial connection and enforces a minimum gap between the end of
+    one transaction and the next write, giving loads time to recover.
+
+    All other attributes are passed through to wrapped connection.
+    """
+
+    def __init__(self, serial_connection, frame_gap=0.0, tracer=None):
+        """
+        :param serial_connection: Serial connection
+        :param frame_gap: Minimum gap between transactions in seconds
+        :param tracer: tracing.Tracer recording pacing sleeps, or None
+        :return: None
+        """
+        self.serial = serial_connection
+        self.frame_gap = frame_gap
+        self.tracer = tracer
+        self.__last_io = None
+
+    def write(self, data_str):
+        if self.__last_io is not None and self.frame_gap:
+            delay = self.__last_io + self.frame_gap - monotonic()
+            if delay > 0:
+                with span(self.tracer, 'pace', self):
+                    time.sleep(delay)
+        bytes_written = self.serial.write(data_str)
+        self.__last_io = monotonic()
+        return bytes_written
+
+    def read(self, length=1):
+        read_string = self.serial.read(length)
+        self.__last_io = monotonic()
+        return read_string
+
+    def __getattr__(self, name):
+        return getattr(self.serial, name)
+
+
+def measure(serial_connection, address, trials=10, frame_gap=0.0, port=None):
+    """
+    Sends status requests to a load and counts failures.
+
+    :param serial_connection: Open serial connection at baud rate to test
+    :param address: Load address
+    :param trials: Number of status requests
+    :param frame_gap: Gap between transactions in seconds
+    :param port: Port name stored in result
+    :return: Measurement
+    """
+    paced = PacedSerial(serial_connection, frame_gap)
+    load = Load(address, paced, print_errors=False, lazy=True)
+    errors = 0
+    start = monotonic()
+    for _ in range(trials):
+        try:
+            load.update_status(retry_count=0)
+        except IOError:
+            errors += 1
+    elapsed = monotonic() - start
+    return Measurement(port, address, getattr(serial_connection, 'baudrate', None), frame_gap,
+                       trials, errors, elapsed)
+
+
+def sweep_port(serial_connection, addresses, baudrates, frame_gaps=(0.0,), trials=10, port=None,
+               settle_time=0.1):
+    """
+    Measures all loads on one port for every baud rate and frame gap.
+
+    :param serial_connection: Open serial connection.  Its baudrate is changed during sweep.
+    :param addresses: Load addresses on this port
+    :param baudrates: PC baud rates to test
+    :param frame_gaps: Gaps between transactions to test, in seconds
+    :param trials: Status requests per load per operating point
+    :param port: Port name stored in results
+    :param settle_time: Pause after a baud rate change, so a failed load can recover
+    :return: list of Measurement
+    """
+    results = []
+    for baudrate in baudrates:
+        serial_connection.baudrate = baudrate
+        for frame_gap in frame_gaps:
+            time.sleep(settle_time)
+            for address in addresses:
+                results.append(measure(serial_connection, address, trials, frame_gap, port))
+    return results
+
+
+def characterize(ports, addresses, baudrates, frame_gaps=(0.0,), trials=10, serial_factory=None, timeout=0.5):
+    """
+    Sweeps several ports in parallel, one thread per port.
+
+    :param ports: Serial port names
+    :param addresses: Load addresses, same for all ports, or dict of port -> addresses
+    :param baudrates: PC baud rates to test
+    :param frame_gaps: Gaps between transactions to test, in seconds
+    :param trials: Status requests per load per operating point
+    :param serial_factory: Called as serial_factory(port, baudrate, timeout=timeout).
+                           Defaults to serial.Serial.
+    :param timeout: Read timeout in seconds
+    :return: dict of port -> list of Measurement
+    """
+    if serial_factory is None:
+        import serial
+        serial_factory = serial.Serial
+    if not isinstance(addresses, dict):
+        addresses = dict((port, addresses) for port in ports)
+    results = {}
+
+    def run(port):
+        serial_connection = serial_factory(port, baudrates[0], timeout=timeout)
+        try:
+            results[port] = sweep_port(serial_connection, addresses[port], baudrates, frame_gaps, trials, port)
+        finally:
+            serial_connection.close()
+
+    threads = [threading.Thread(target=run, args=(port,)) for port in ports]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def best_operating_point(measurements, max_error_rate=0.0):
+    """
+    Fastest (baudrate, frame_gap) at which every load on the bus stays within max_error_rate.
+
+    :param measurements: Measurements of one port
+    :param max_error_rate: Allowed fraction of failed commands
+    :return: dict with baudrate, frame_gap, commands_per_second and error_rate, or None
+    """
+    points = collections.OrderedDict()
+    for measurement in measurements:
+        points.setdefault((measurement.baudrate, measurement.frame_gap), []).append(measurement)
+    best = None
+    for (baudrate, frame_gap), point in points.items():
+        commands = sum(m.commands for m in point)
+        errors = sum(m.errors for m in point)
+        elapsed = sum(m.elapsed for m in point)
+        if not commands or max(error_rate(m) for m in point) > max_error_rate:
+            continue
+        candidate = {'baudrate': baudrate,
+                     'frame_gap': frame_gap,
+                     'commands_per_second': commands / elapsed if elapsed else 0.0,
+                     'error_rate': errors / commands}
+        if best is None or candidate['commands_per_second'] > best['commands_per_second']:
+            best = candidate
+    return best
+
+
+def update_cache(path, results, max_error_rate=0.0):
+    """
+    Stores best operating point of each port and load in a JSON cache file.
+    Existing entries for other ports are kept.
+
+    :param path: Cache file path
+    :param results: dict of port -> list of Measurement, from characterize
+    :param max_error_rate: Allowed fraction of failed commands
+    :return: cache dict written
+    """
+    cache = load_cache(path)
+    for port, measurements in results.items():
+        by_address = collections.OrderedDict()
+        for measurement in measurements:
+            by_address.setdefault(measurement.address, []).append(measurement)
+        cache[port] = {
+            'measured': time.time(),
+            'bus': best_operating_point(measurements, max_error_rate),
+            'loads': dict((str(address), best_operating_point(address_measurements, max_error_rate))
+                          for address, address_measurements in by_address.items())}
+    with open(path, 'w') as cache_file:
+        json.dump(cache, cache_file, indent=2, sort_keys=True)
+    return cache
+
+
+def load_cache(path):
+    """
+    Reads cache file, returning empty cache if it does not exist
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as cache_file:
+        return json.load(cache_file)
+
+
+def lookup(cache, port, address=None):
+    """
+    Cached operating point of a port, or one load on it.
+
+    :param cache: dict from load_cache
+    :param port: Serial port name
+    :param address: Load address, or None for the point shared by all loads on the port
+    :return: dict with baudrate and frame_gap, or None if not measured
+    """
+    entry = cache.get(port)
+    if entry is None:
+        return None
+    if address is None:
+        return entry.get('bus')
+    return entry.get('loads', {}).get(str(address))
+
+
+def open_bus(port, cache_path, default_baudrate=9600, timeout=1, serial_factory=None):
+    """
+    Opens a serial connection at the cached operating point of the port.
+
+    :param port: Serial port name
+    :param cache_path: Cache file written by update_cache
+    :param default_baudrate: Baud rate used if port was not measured
+    :param timeout: Read timeout in seconds
+    :param serial_factory: Defaults to serial.Serial
+    :return: Serial connection, wrapped in PacedSerial if a frame gap was measured
+    """
+    if serial_factory is None:
+        import serial
+        serial_factory = serial.Serial
+    point = lookup(load_cache(cache_path), port) or {}
+    serial_connection = serial_factory(port, point.get('baudrate', default_baudrate), timeout=timeout)
+    if point.get('frame_gap'):
+        return PacedSerial(serial_connection, point['frame_gap'])
+    return serial_connection
@@ -0,0 +1,194 @@
+"""
+Host side calibration of loads.
+
+A CalibrationProfile holds piecewise linear correction tables for one load:
+reading tables map what the load reports to the true value, setpoint tables
+map a wanted value to what must be sent so the load really applies it.
+Tables are precomputed into segment slopes and offsets when loaded, so a
+correction is a bisect and one multiply-add, or one vectorized pass over
+a recorded array.
+
+Attach a profile to a Load to correct its readings and setpoints:
+
+    profiles = calibration.load_profiles('calibration.json')
+    load.calibration = profiles['COM4:0']
+
+Profile file:
+
+    {
+      "COM4:0": {
+        "readings": {"voltage": [[0.0, 0.002], [30.0, 30.05]]},
+        "setpoints": {"current": [[0.0, 0.0], [10.0, 9.98], [30.0, 29.9]]}
+      }
+    }
+
+Reading points are [reported, actual], setpoint points are [sent, actual],
+all in Amps, Volts, Watts or Ohms.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import bisect
+import json
+
+__author__ = 'Joe Sacher'
+
+READING_NAMES = ('current', 'voltage', 'power', 'resistance')
+SETPOINT_NAMES = ('current', 'power', 'resistance')
+
+
+class CalibrationTable(object):
+    """
+    Piecewise linear mapping, extrapolated with the end segments.
+    A single point is a pure offset.
+    """
+
+    def __init__(self, points):
+        """
+        :param points: Iterable of (x, y) pairs, x strictly increasing after sorting
+        :return: None
+        """
+        points = sorted((float(x), float(y)) for x, y in points)
+        if not points:
+            raise ValueError("Calibration table needs at least one point")
+        if len(points) == 1:
+            points.append((points[0][0] + 1.0, points[0][1] + 1.0))
+        self.points = points
+        self.xs = [x for x, _ in points]
+        for x0, x1 in zip(self.xs, self.xs[1:]):
+            if x0 == x1:
+                raise ValueError("Calibration points must have distinct inputs")
+        self.slopes = []
+        self.offsets = []
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            slope = (y1 - y0) / (x1 - x0)
+            self.slopes.append(slope)
+            self.offsets.append(y0 - slope * x0)
+        # Segment breakpoints, excluding ends which extrapolate.
+        self.__breaks = self.xs[1:-1]
+
+    def __call__(self, value):
+        segment = bisect.bisect_right(self.__breaks, value)
+        return self.offsets[segment] + self.slopes[segment] * value
+
+    def apply_array(self, values):
+        """
+        Vectorized correction of a NumPy array.
+
+        :param values: array like of inputs
+        :return: float64 array
+        """
+        import numpy as np
+        values = np.asarray(values, dtype=np.float64)
+        segments = np.searchsorted(np.asarray(self.__breaks), values, side='right')
+        return np.asarray(self.offsets)[segments] + np.asarray(self.slopes)[segments] * values
+
+    def inverse(self):
+        """
+        Table mapping outputs back to inputs.  Mapping must be strictly increasing.
+        """
+        ys = [y for _, y in self.points]
+        if any(y1 <= y0 for y0, y1 in zip(ys, ys[1:])):
+            raise ValueError("Calibration table is not strictly increasing, can't be inverted")
+        return CalibrationTable((y, x) for x, y in self.points)
+
+
+class CalibrationProfile(object):
+    """
+    Correction tables of one load.
+    """
+
+    def __init__(self, readings=None, setpoints=None):
+        """
+        :param readings: dict of reading name -> [reported, actual] points
+        :param setpoints: dict of setpoint name -> [sent, actual] points
+        :return: None
+        """
+        readings = readings or {}
+        setpoints = setpoints or {}
+        for name in readings:
+            if name not in READING_NAMES:
+                raise ValueError("Unknown reading {}".format(name))
+        for name in setpoints:
+            if name not in SETPOINT_NAMES:
+                raise ValueError("Unknown setpoint {}".format(name))
+        self.reading_tables = dict((name, CalibrationTable(points)) for name, points in readings.items())
+        self.setpoint_points = dict((name, [list(point) for point in points]) for name, points in setpoints.items())
+        # Wanted value -> value to send
+        self.setpoint_tables = dict((name, CalibrationTable(points).inverse())
+                                    for name, points in setpoints.items())
+
+    def reading(self, name, value):
+        """
+        Corrects a reading.
+
+        :param name: 'current', 'voltage', 'power' or 'resistance'
+        :param value: Reported value in Amps, Volts, Watts or Ohms
+        :return: corrected value
+        """
+        table = self.reading_tables.get(name)
+        if table is None:
+            return value
+        return table(value)
+
+    def reading_array(self, name, values):
+        """
+        Corrects a NumPy array of readings in one pass.
+        """
+        table = self.reading_tables.get(name)
+        if table is None:
+            import numpy as np
+            return np.asarray(values, dtype=np.float64)
+        return table.apply_array(values)
+
+    def setpoint(self, name, value):
+        """
+        Value to send so the load applies the wanted setpoint.
+
+        :param name: 'current', 'power' or 'resistance'
+        :param value: Wanted value in Amps, Watts or Ohms
+        :return: value to send, before quantizing
+        """
+        table = self.setpoint_tables.get(name)
+        if table is None:
+            return value
+        return table(value)
+
+    def correct_recording(self, recording):
+        """
+        Corrected readings of an analysis.Recording, in engineering units.
+
+        :return: dict of reading name -> float64 array
+        """
+        return dict((name, self.reading_array(name, recording.engineering(name))) for name in READING_NAMES)
+
+    def to_dict(self):
+        return {'readings': dict((name, table.points) for name, table in self.reading_tables.items()),
+                'setpoints': self.setpoint_points}
+
+
+def load_profiles(path):
+    """
+    Reads calibration profiles file.
+
+    :param path: JSON file of profile key -> profile
+    :return: dict of profile key -> CalibrationProfile
+    """
+    with open(path) as profile_file:
+        data = json.load(profile_file)
+    return dict((key, CalibrationProfile(profile.get('readings'), profile.get('setpoints')))
+                for key, profile in data.items())
+
+
+def save_profiles(path, profiles):
+    """
+    Writes calibration profiles file.
+
+    :param path: JSON file path
+    :param profiles: dict of profile key -> CalibrationProfile
+    :return: None
+    """
+    with open(path, 'w') as profile_file:
+        json.dump(dict((key, profile.to_dict()) for key, profile in profiles.items()),
+                  profile_file, indent=2, sort_keys=True)
@@ -0,0 +1,248 @@
+"""
+Binary capture of raw bus traffic.
+
+Every frame written to or read from a serial connection is stored as a
+fixed size record, so a capture can be memory mapped and searched by time
+without parsing the whole file.
+
+File layout:
+  header: magic, version, record size, wall clock start, monotonic start
+  records: monotonic timestamp, bus id, direction, valid length, 26 byte frame
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import bisect
+import collections
+import mmap
+import struct
+import threading
+import time
+
+from .array3710 import Load, monotonic
+
+__author__ = 'Joe Sacher'
+
+DIRECTION_TX = 0
+DIRECTION_RX = 1
+
+CaptureRecord = collections.namedtuple('CaptureRecord', 'timestamp bus_id direction data')
+
+
+class CaptureFormat(object):
+    """
+    Description of capture file structures
+    """
+    MAGIC = b'A3710CAP'
+    VERSION = 1
+
+    STRUCT_HEADER = struct.Struct(b'< 8s 2H 2d 4x')
+    STRUCT_RECORD = struct.Struct(b'< d H 2B 26s 2x')
+    STRUCT_TIMESTAMP = struct.Struct(b'< d')
+
+    HEADER_SIZE = STRUCT_HEADER.size
+    RECORD_SIZE = STRUCT_RECORD.size
+
+
+class CaptureWriter(object):
+    """
+    Appends frame records to a capture file through a buffered file object.
+
+    A single writer may be shared by several buses, each with its own bus_id.
+    """
+
+    def __init__(self, path, buffer_size=65536):
+        """
+        :param path: File to create.  Existing files are overwritten.
+        :param buffer_size: Size of write buffer in bytes
+        :return: None
+        """
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__file = open(path, 'wb', buffer_size)
+        self.wall_start = time.time()
+        self.monotonic_start = monotonic()
+        self.__file.write(CaptureFormat.STRUCT_HEADER.pack(
+            CaptureFormat.MAGIC, CaptureFormat.VERSION, CaptureFormat.RECORD_SIZE,
+            self.wall_start, self.monotonic_start))
+        self.record_count = 0
+
+    def record(self, bus_id, direction, data):
+        """
+        Appends records for data.  Data longer than one frame is split
+        across records.  Empty data (a read timeout) is stored as a
+        zero length record.
+
+        :param bus_id: Identifier of bus (0-65535)
+        :param direction: DIRECTION_TX or DIRECTION_RX
+        :param data: byte string sent or received
+        :return: None
+        """
+        frame_length = Load.FRAME_LENGTH
+        if not data:
+            # Read timeout, SerialTester returns a text ''
+            data = b''
+        data = bytes(bytearray(data))
+        chunks = [data[pos:pos + frame_length] for pos in range(0, len(data), frame_length)] or [b'']
+        with self.__lock:
+            # Timestamp is taken under lock, so records are in time order in file.
+            timestamp = monotonic()
+            for chunk in chunks:
+                self.__file.write(CaptureFormat.STRUCT_RECORD.pack(timestamp, bus_id, direction,
+                                                                   len(chunk), chunk))
+            self.record_count += len(chunks)
+
+    def flush(self):
+        """
+        Flushes buffered records to disk
+        """
+        with self.__lock:
+            self.__file.flush()
+
+    def close(self):
+        with self.__lock:
+            if not self.__file.closed:
+                self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CaptureSerial(object):
+    """
+    Wraps a serial connection and records all traffic to a CaptureWriter.
+
+    Can be passed to Load in place of the serial connection.
+    All other attributes are passed through to wrapped connection.
+    """
+
+    def __init__(self, serial_connection, writer, bus_id=0):
+        self.serial = serial_connection
+        self.writer = writer
+        self.bus_id = bus_id
+
+    def write(self, data_str):
+        bytes_written = self.serial.write(data_str)
+        self.writer.record(self.bus_id, DIRECTION_TX, data_str)
+        return bytes_written
+
+    def read(self, length=1):
+        read_string = self.serial.read(length)
+        self.writer.record(self.bus_id, DIRECTION_RX, read_string)
+        return read_string
+
+    def __getattr__(self, name):
+        return getattr(self.serial, name)
+
+
+class CaptureReader(object):
+    """
+    Memory mapped, random access reader for capture files.
+
+    Records are fixed size, so any record is found by offset.  A sparse
+    index of timestamps (one per INDEX_STRIDE records) is built on open,
+    so seeking by time only touches a few pages of the file.
+    """
+
+    INDEX_STRIDE = 4096
+
+    def __init__(self, path):
+        self.path = path
+        self.__file = open(path, 'rb')
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.__map) < CaptureFormat.HEADER_SIZE:
+            raise ValueError("File too short for capture header")
+        (magic, version, record_size,
+         self.wall_start, self.monotonic_start) = CaptureFormat.STRUCT_HEADER.unpack_from(self.__map, 0)
+        if magic != CaptureFormat.MAGIC:
+            raise ValueError("Not a capture file")
+        if version != CaptureFormat.VERSION or record_size != CaptureFormat.RECORD_SIZE:
+            raise ValueError("Unsupported capture version {} with record size {}".format(version, record_size))
+        # A partially written last record is ignored.
+        self.__count = (len(self.__map) - CaptureFormat.HEADER_SIZE) // CaptureFormat.RECORD_SIZE
+        self.__index = [self.timestamp(ind) for ind in range(0, self.__count, self.INDEX_STRIDE)]
+
+    def __len__(self):
+        return self.__count
+
+    def __offset(self, index):
+        if index < 0:
+            index += self.__count
+        if not 0 <= index < self.__count:
+            raise IndexError("Record index out of range")
+        return CaptureFormat.HEADER_SIZE + index * CaptureFormat.RECORD_SIZE
+
+    def timestamp(self, index):
+        """
+        Monotonic timestamp of record, without decoding the rest of it.
+        """
+        return CaptureFormat.STRUCT_TIMESTAMP.unpack_from(self.__map, self.__offset(index))[0]
+
+    def __getitem__(self, index):
+        timestamp, bus_id, direction, length, frame = CaptureFormat.STRUCT_RECORD.unpack_from(
+            self.__map, self.__offset(index))
+        return CaptureRecord(timestamp, bus_id, direction, frame[:length])
+
+    def __iter__(self):
+        for ind in range(self.__count):
+            yield self[ind]
+
+    def wall_time(self, timestamp):
+        """
+        Converts a record timestamp to wall clock time (seconds since epoch)
+        """
+        return self.wall_start + (timestamp - self.monotonic_start)
+
+    def seek(self, timestamp):
+        """
+        Finds first record at or after timestamp.
+
+        :param timestamp: monotonic timestamp, as stored in records
+        :return: record index (len(self) if all records are earlier)
+        """
+        block = max(bisect.bisect_left(self.__index, timestamp) - 1, 0)
+        low = block * self.INDEX_STRIDE
+        high = min(low + self.INDEX_STRIDE, self.__count)
+        while low < high:
+            mid = (low + high) // 2
+            if self.timestamp(mid) < timestamp:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def seek_wall(self, wall_time):
+        """
+        Finds first record at or after a wall clock time (seconds since epoch)
+        """
+        return self.seek(wall_time - self.wall_start + self.monotonic_start)
+
+    def between(self, start, end, bus_id=None):
+        """
+        Iterates records with start <= timestamp < end.
+
+        :param start: monotonic timestamp to start at
+        :param end: monotonic timestamp to stop before
+        :param bus_id: only yield records of this bus, if given
+        :yield: CaptureRecord
+        """
+        for ind in range(self.seek(start), self.__count):
+            record = self[ind]
+            if record.timestamp >= end:
+                break
+            if bus_id is None or record.bus_id == bus_id:
+                yield record
+
+    def close(self):
+        self.__map.close()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
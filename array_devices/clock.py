@@ -0,0 +1,139 @@
+"""
+Program clock calibration.
+
+Program mode of the 3710A runs steps faster than programmed (a 10 second
+step takes about 7 seconds).  measure_clock_factor runs a short repeating
+two step program, polls the load as fast as the bus allows and times the
+step changes, giving the load's clock factor: real step time / programmed
+step time.  With load.clock_factor set, set_program_sequence corrects step
+durations so programs run for their intended time.
+
+The load must have a source connected, so the measured value follows the
+program steps.  Factors are stored per load in a JSON file:
+
+    factors = clock.load_clock_factors('clock.json')
+    load.clock_factor = factors.get('COM4:0', 1.0)
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import json
+import os
+import time
+
+from .array3710 import Program, monotonic
+
+__author__ = 'Joe Sacher'
+
+ClockMeasurement = collections.namedtuple(
+    'ClockMeasurement', 'clock_factor step_duration transitions uncertainty poll_errors')
+
+# Reading that follows the steps of each program type, in load units
+_PROGRAM_FIELDS = {Program.PROG_TYPE_CURRENT: 'current',
+                   Program.PROG_TYPE_POWER: 'power',
+                   Program.PROG_TYPE_RESISTANCE: 'current'}
+
+
+def measure_clock_factor(load, low, high, step_duration=5, transitions=5,
+                         program_type=Program.PROG_TYPE_CURRENT, field=None, timeout=None):
+    """
+    Times program steps of a load.  Blocks for about (transitions + 1) * step_duration * 0.7 seconds.
+
+    :param load: Load, in remote control with a source connected
+    :param low: Setting of first step, in Amps, Watts or Ohms depending on program_type
+    :param high: Setting of second step
+    :param step_duration: Programmed step duration in seconds
+    :param transitions: Step changes to time, at least 2.  More gives a better factor.
+    :param program_type: Program.PROG_TYPE_*
+    :param field: StatusSnapshot field that follows steps, defaults by program type
+    :param timeout: Seconds before giving up, defaults to twice the programmed time
+    :return: ClockMeasurement
+    """
+    if transitions < 2:
+        raise ValueError("At least 2 transitions are needed")
+    if field is None:
+        field = _PROGRAM_FIELDS[program_type]
+    if timeout is None:
+        timeout = 2 * (transitions + 1) * step_duration
+    program = Program(program_type, Program.RUN_REPEAT)
+    program.add_step(low, step_duration)
+    program.add_step(high, step_duration)
+
+    clock_factor, load.clock_factor = load.clock_factor, 1.0
+    try:
+        load.set_program_sequence(program)
+    finally:
+        load.clock_factor = clock_factor
+
+    # Midpoint between the readings of the two steps, found at the first clear change
+    threshold = None
+    first = None
+    previous = None
+    times = []
+    gaps = []
+    poll_errors = 0
+    load.start_program()
+    start = monotonic()
+    try:
+        while len(times) < transitions:
+            if monotonic() - start > timeout:
+                raise IOError("Saw {} of {} program step changes before timeout".format(len(times), transitions))
+            try:
+                status = load.update_status(retry_count=0)
+            except IOError:
+                poll_errors += 1
+                continue
+            value = getattr(status, field)
+            if previous is None:
+                first = value
+            else:
+                if threshold is None and abs(value - first) > max(abs(first) / 10, 1):
+                    threshold = (first + value) / 2
+                if threshold is not None and (value > threshold) != (previous[1] > threshold):
+                    times.append((previous[0] + status.timestamp) / 2)
+                    gaps.append(status.timestamp - previous[0])
+            previous = (status.timestamp, value)
+    finally:
+        load.stop_program()
+
+    span = times[-1] - times[0]
+    programmed = (len(times) - 1) * step_duration
+    # Each transition is known to half the poll gap around it
+    uncertainty = (gaps[0] + gaps[-1]) / 2 / programmed
+    return ClockMeasurement(span / programmed, step_duration, len(times), uncertainty, poll_errors)
+
+
+def load_clock_factors(path):
+    """
+    Reads clock factors file, returning empty dict if it does not exist
+
+    :return: dict of load key -> clock factor
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as factor_file:
+        return dict((key, entry['clock_factor']) for key, entry in json.load(factor_file).items())
+
+
+def save_clock_factor(path, key, measurement):
+    """
+    Stores the clock factor of a load.  Entries of other loads are kept.
+
+    :param path: JSON file path
+    :param key: Key identifying the load, ex: 'COM4:0'
+    :param measurement: ClockMeasurement
+    :return: None
+    """
+    entries = {}
+    if os.path.exists(path):
+        with open(path) as factor_file:
+            entries = json.load(factor_file)
+    entries[key] = {'clock_factor': measurement.clock_factor,
+                    'uncertainty': measurement.uncertainty,
+                    'step_duration': measurement.step_duration,
+                    'transitions': measurement.transitions,
+                    'measured': time.time()}
+    with open(path, 'w') as factor_file:
+        json.dump(entries, factor_file, indent=2, sort_keys=True)
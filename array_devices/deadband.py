@@ -0,0 +1,175 @@
+"""
+Deadband compression of status streams.
+
+In steady state almost every 0x91 sample equals the one before it.
+DeadbandFilter passes a sample on only when a measurement moves more than
+its threshold from the last sample passed, the state flags change, or a
+keyframe is due.  reconstruct rebuilds the full rate series from the
+compressed samples by holding each value until the next one.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import bisect
+import collections
+
+from .telemetry import MEASUREMENT_FIELDS
+
+__author__ = 'Joe Sacher'
+
+
+def _sample_key(sample):
+    return sample.address
+
+
+class DeadbandFilter(object):
+    """
+    Per load deadband filter for StatusSample streams.
+    """
+
+    def __init__(self, thresholds=None, keyframe_interval=60.0, key=_sample_key):
+        """
+        :param thresholds: dict of measurement field -> allowed change in load units
+                           (mA, mV, 0.1 W, 0.01 ohms).  Missing fields use 0, any change.
+                           Ex: {'current': 5, 'voltage': 10}
+        :param keyframe_interval: Seconds after which a sample is passed even if unchanged.
+                                  None for no keyframes.
+        :param key: Function giving the load a sample belongs to.  Defaults to address,
+                    use (bus, address) when filtering several buses together.
+        :return: None
+        """
+        thresholds = thresholds or {}
+        for name in thresholds:
+            if name not in MEASUREMENT_FIELDS:
+                raise ValueError("No deadband for field {}".format(name))
+        self.thresholds = tuple((name, thresholds.get(name, 0)) for name in MEASUREMENT_FIELDS)
+        self.keyframe_interval = keyframe_interval
+        self.key = key
+        self.received = 0
+        self.passed = 0
+        self.__last = {}
+        self.__last_keyframe = {}
+        # key -> timestamp of last sample received, passed or not
+        self.__last_received = {}
+
+    @property
+    def compression_ratio(self):
+        """
+        Samples received per sample passed
+        """
+        if not self.passed:
+            return 0.0
+        return self.received / self.passed
+
+    def last_received(self, key):
+        """
+        Timestamp of last sample received for a load, passed or not.
+        Use as end of reconstruct_uniform, since the series runs past the last passed sample.
+
+        :param key: Load key, address by default
+        :return: timestamp, or None if no sample received
+        """
+        return self.__last_received.get(key)
+
+    def __changed(self, sample, last):
+        if sample.state != last.state:
+            return True
+        if sample.max_current != last.max_current or sample.max_power != last.max_power:
+            return True
+        for name, threshold in self.thresholds:
+            if abs(getattr(sample, name) - getattr(last, name)) > threshold:
+                return True
+        return False
+
+    def filter(self, sample):
+        """
+        :param sample: StatusSample
+        :return: sample if it should be passed on, otherwise None
+        """
+        self.received += 1
+        key = self.key(sample)
+        self.__last_received[key] = sample.timestamp
+        last = self.__last.get(key)
+        keyframe = last is None or (self.keyframe_interval is not None and
+                                    sample.timestamp - self.__last_keyframe[key] >= self.keyframe_interval)
+        if not keyframe and not self.__changed(sample, last):
+            return None
+        if keyframe:
+            self.__last_keyframe[key] = sample.timestamp
+        self.__last[key] = sample
+        self.passed += 1
+        return sample
+
+    def filter_stream(self, samples):
+        """
+        Iterates samples that pass the filter.
+        """
+        for sample in samples:
+            if self.filter(sample) is not None:
+                yield sample
+
+    def reset(self):
+        """
+        Forgets previous samples, so next sample of every load is passed
+        """
+        self.__last.clear()
+        self.__last_keyframe.clear()
+        self.__last_received.clear()
+
+
+def reconstruct(samples, timestamps, key=None, max_hold=None):
+    """
+    Rebuilds values at given times from deadband filtered samples of one load,
+    holding each sample until the next.
+
+    :param samples: Passed StatusSamples, in time order
+    :param timestamps: Times to rebuild values at, in order
+    :param key: Only use samples with this key (address by default), if given
+    :param max_hold: Seconds a sample may be held.  Set to the keyframe interval
+                     (plus a poll interval) to get None where data is missing.
+    :return: list of StatusSample with timestamps given, or None before first sample
+    """
+    if key is not None:
+        samples = [sample for sample in samples if _sample_key(sample) == key]
+    times = [sample.timestamp for sample in samples]
+    rebuilt = []
+    for timestamp in timestamps:
+        ind = bisect.bisect_right(times, timestamp) - 1
+        if ind < 0 or (max_hold is not None and timestamp - times[ind] > max_hold):
+            rebuilt.append(None)
+        else:
+            rebuilt.append(samples[ind]._replace(timestamp=timestamp))
+    return rebuilt
+
+
+def reconstruct_uniform(samples, interval, end, start=None, max_hold=None):
+    """
+    Rebuilds values of one load on a uniform time grid.
+
+    :param samples: Passed StatusSamples of one load, in time order
+    :param interval: Grid spacing in seconds, usually the poll interval
+    :param end: Last grid time.  Samples after the last passed one were dropped as
+                unchanged, so use the last received time, see DeadbandFilter.last_received.
+    :param start: First grid time, defaults to first sample
+    :param max_hold: See reconstruct
+    :return: list of StatusSample or None
+    """
+    if not samples:
+        return []
+    if start is None:
+        start = samples[0].timestamp
+    count = int((end - start) / interval + 1e-9) + 1
+    return reconstruct(samples, [start + ind * interval for ind in range(count)], max_hold=max_hold)
+
+
+def split_by_load(samples, key=_sample_key):
+    """
+    Groups samples by load, keeping time order.
+
+    :return: OrderedDict of key -> list of samples
+    """
+    loads = collections.OrderedDict()
+    for sample in samples:
+        loads.setdefault(key(sample), []).append(sample)
+    return loads
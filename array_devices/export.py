@@ -0,0 +1,273 @@
+"""
+Streaming export of status samples.
+
+Sinks take StatusSamples from the acquisition path without touching the
+disk: write() only appends to an in-memory batch.  A writer thread per sink
+flushes batches when they reach a size or age threshold, and starts a new
+file when the current one reaches a size limit.
+
+CsvSink needs nothing extra, NpySink needs NumPy and ParquetSink needs pyarrow.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import csv
+import os
+import struct
+import threading
+
+from .array3710 import PY2, monotonic
+from .telemetry import SAMPLE_FIELDS
+
+__author__ = 'Joe Sacher'
+
+
+class ExportSink(object):
+    """
+    Batching and rotation common to all sinks.  Subclasses implement
+    _open, _write_batch and _close for their file format.
+    """
+
+    def __init__(self, path, batch_size=1000, flush_interval=1.0, max_file_size=None, max_pending=1000000):
+        """
+        :param path: Output path.  With rotation, may contain {index}, ex: 'run_{index:04d}.csv',
+                     otherwise the index is added before the extension.
+        :param batch_size: Samples that trigger a flush
+        :param flush_interval: Seconds after which pending samples are flushed
+        :param max_file_size: Bytes after which a new file is started, None for one file
+        :param max_pending: Samples kept in memory if the disk falls behind.  Newer samples
+                            are dropped (and counted in dropped) so write() never blocks.
+        :return: None
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_size = max_file_size
+        self.max_pending = max_pending
+        self.file_index = 0
+        self.files = []
+        self.written = 0
+        self.dropped = 0
+        self.error = None
+        self.__pending = []
+        self.__condition = threading.Condition()
+        self.__closing = False
+        # flush() calls made, and the last one whose batch has been written
+        self.__flush_requested = 0
+        self.__flush_done = 0
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def write(self, sample):
+        """
+        Queues a sample for export.  Never blocks on disk IO.
+
+        :param sample: StatusSample
+        :return: None
+        """
+        with self.__condition:
+            if len(self.__pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self.__pending.append(sample)
+            if len(self.__pending) >= self.batch_size:
+                self.__condition.notify_all()
+
+    def file_path(self, index):
+        if '{index' in self.path:
+            return self.path.format(index=index)
+        if self.max_file_size is None:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return '{}_{:04d}{}'.format(root, index, ext)
+
+    def __run(self):
+        current_path = None
+        last_flush = monotonic()
+        while True:
+            with self.__condition:
+                while (not self.__closing and len(self.__pending) < self.batch_size and
+                       self.__flush_requested == self.__flush_done):
+                    remaining = last_flush + self.flush_interval - monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__condition.wait(remaining)
+                batch, self.__pending = self.__pending, []
+                closing = self.__closing
+                flush_requested = self.__flush_requested
+            last_flush = monotonic()
+            try:
+                if batch:
+                    if current_path is None:
+                        current_path = self.file_path(self.file_index)
+                        self._open(current_path)
+                        self.files.append(current_path)
+                    self._write_batch(batch)
+                    self.written += len(batch)
+                    if self.max_file_size is not None and self._size() >= self.max_file_size:
+                        self._close()
+                        current_path = None
+                        self.file_index += 1
+            except Exception as err:
+                # Keep draining, so acquisition is not held up by a broken sink.
+                self.error = err
+            with self.__condition:
+                self.__flush_done = flush_requested
+                self.__condition.notify_all()
+            if closing:
+                if current_path is not None:
+                    self._close()
+                return
+
+    def flush(self):
+        """
+        Writes pending samples without waiting for thresholds.
+        Blocks until they are written.
+        """
+        with self.__condition:
+            self.__flush_requested += 1
+            request = self.__flush_requested
+            self.__condition.notify_all()
+            while self.__flush_done < request and self.__thread.is_alive():
+                self.__condition.wait(0.1)
+
+    def close(self):
+        """
+        Writes pending samples, closes file and stops writer thread
+        """
+        with self.__condition:
+            self.__closing = True
+            self.__condition.notify_all()
+        self.__thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _open(self, path):
+        raise NotImplementedError
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+    def _size(self):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class CsvSink(ExportSink):
+    """
+    CSV file per rotation, with a header row of StatusSample fields in load units
+    """
+
+    def _open(self, path):
+        if PY2:
+            self.__file = open(path, 'wb')
+        else:
+            self.__file = open(path, 'w', newline='')
+        self.__writer = csv.writer(self.__file)
+        self.__writer.writerow(SAMPLE_FIELDS)
+
+    def _write_batch(self, batch):
+        self.__writer.writerows(batch)
+        self.__file.flush()
+
+    def _size(self):
+        return self.__file.tell()
+
+    def _close(self):
+        self.__file.close()
+
+
+class NpySink(ExportSink):
+    """
+    NumPy .npy file per rotation, holding a structured array of
+    analysis.SAMPLE_DTYPE.  Load with analysis.Recording(numpy.load(path)).
+
+    Header is written with room for the final shape and updated on close,
+    so the file is valid NPY once closed.
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        import numpy
+        from .analysis import SAMPLE_DTYPE
+        self.__numpy = numpy
+        self.__dtype = SAMPLE_DTYPE
+        self.__count = 0
+        # Header is sized for the largest count, so rewriting it never moves the data.
+        self.__header_length = len(self.__header_text(2 ** 64))
+        super(NpySink, self).__init__(path, *args, **kwargs)
+
+    def __header_text(self, count):
+        return "{{'descr': {!r}, 'fortran_order': False, 'shape': ({},), }}".format(
+            self.__numpy.lib.format.dtype_to_descr(self.__dtype), count)
+
+    def __header(self):
+        # magic, version 1.0, header length, header padded with spaces and newline to 64 bytes
+        total = -(-(10 + self.__header_length + 1) // 64) * 64
+        header = self.__header_text(self.__count).ljust(total - 10 - 1) + '\n'
+        return b'\x93NUMPY\x01\x00' + struct.pack(b'< H', len(header)) + header.encode('latin1')
+
+    def _open(self, path):
+        self.__count = 0
+        self.__file = open(path, 'wb')
+        self.__file.write(self.__header())
+
+    def _write_batch(self, batch):
+        self.__file.write(self.__numpy.array([tuple(sample) for sample in batch], dtype=self.__dtype).tobytes())
+        self.__count += len(batch)
+        self.__file.flush()
+
+    def _size(self):
+        return self.__file.tell()
+
+    def _close(self):
+        self.__file.seek(0)
+        self.__file.write(self.__header())
+        self.__file.close()
+
+
+class ParquetSink(ExportSink):
+    """
+    Parquet file per rotation, one row group per batch.  Requires pyarrow.
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        import pyarrow
+        import pyarrow.parquet
+        self.__pyarrow = pyarrow
+        self.__parquet = pyarrow.parquet
+        self.__schema = pyarrow.schema([(str('timestamp'), pyarrow.float64()),
+                                        (str('address'), pyarrow.uint8()),
+                                        (str('current'), pyarrow.uint16()),
+                                        (str('voltage'), pyarrow.uint32()),
+                                        (str('power'), pyarrow.uint16()),
+                                        (str('max_current'), pyarrow.uint16()),
+                                        (str('max_power'), pyarrow.uint16()),
+                                        (str('resistance'), pyarrow.uint16()),
+                                        (str('state'), pyarrow.uint8())])
+        super(ParquetSink, self).__init__(path, *args, **kwargs)
+
+    def _open(self, path):
+        self.__path = path
+        self.__writer = self.__parquet.ParquetWriter(path, self.__schema)
+
+    def _write_batch(self, batch):
+        columns = [self.__pyarrow.array(column, type=field.type)
+                   for column, field in zip(zip(*batch), self.__schema)]
+        self.__writer.write_table(self.__pyarrow.Table.from_arrays(columns, schema=self.__schema))
+
+    def _size(self):
+        # Written row groups are on disk, footer is added on close.
+        return os.path.getsize(self.__path)
+
+    def _close(self):
+        self.__writer.close()
@@ -0,0 +1,338 @@
+"""
+Declarative test plans.
+
+A plan describes loads and timed actions as JSON (or YAML, if PyYAML is
+installed).  compile_plan validates every setting with the same limits as
+Load and Program, and encodes all frames up front into a timeline per bus.
+The bus occupancy of a plan can be checked before running it, and
+PlanRunner sends the pre-encoded frames at their scheduled times.
+
+Example plan:
+
+    {
+      "loads": {
+        "dut": {"bus": "main", "address": 0, "max_current": 30, "max_power": 200, "clock_factor": 0.7}
+      },
+      "steps": [
+        {"load": "dut", "remote_control": true},
+        {"load": "dut", "current": 10},
+        {"wait": 2},
+        {"load": "dut", "load_on": true},
+        {"load": "dut", "status": true, "every": 0.5, "until": 10},
+        {"at": 10, "load": "dut", "load_on": false}
+      ]
+    }
+
+Every 0x90 frame carries max current and max power, so loads with
+current, power, resistance or limit steps need "max_current" and
+"max_power" in their definition (or limit steps before other 0x90 steps),
+rather than silently resetting the limits of the rig.
+
+Each step happens at "at" seconds from start, or at the time reached by
+"wait" steps so far.  Actions are:
+  current, power, resistance: set load mode and value (0x90)
+  max_current, max_power: set limits (0x90)
+  remote_control, load_on: set state (0x92)
+  status: read values (0x91)
+  program: {"type": "resistance", "mode": "once", "steps": [[500, 10], ...]} (0x93, 0x94)
+  start_program, stop_program (0x95, 0x96)
+A step with "every" and "until" is repeated until that time.
+Steps are applied in time order, not list order, so each 0x90 and 0x92
+frame carries the settings in effect at the time it is sent.
+Program step durations are corrected by the optional "clock_factor" of
+the load, see clock.measure_clock_factor.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import json
+import struct
+import threading
+import time
+
+from .array3710 import Load, Program, monotonic
+
+__author__ = 'Joe Sacher'
+
+TimelineEntry = collections.namedtuple('TimelineEntry', 'time bus address command frame')
+
+PROGRAM_TYPES = {'current': Program.PROG_TYPE_CURRENT,
+                 'power': Program.PROG_TYPE_POWER,
+                 'resistance': Program.PROG_TYPE_RESISTANCE}
+PROGRAM_MODES = {'once': Program.RUN_ONCE,
+                 'repeat': Program.RUN_REPEAT}
+SET_TYPES = dict((name, set_type) for set_type, name in Load.SET_TYPE_NAMES.items())
+
+# Bits on the wire per byte: start, 8 data, stop
+BITS_PER_BYTE = 10
+
+
+class PlanError(ValueError):
+    """
+    Raised for invalid plans.  Message includes the step that failed.
+    """
+    pass
+
+
+def load_plan(path):
+    """
+    Reads a plan file.  .yaml and .yml files require PyYAML.
+
+    :param path: Plan file path
+    :return: plan dict
+    """
+    with open(path) as plan_file:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError as err:
+                raise ImportError("{}.\nIs PyYAML package installed?".format(err))
+            return yaml.safe_load(plan_file)
+        return json.load(plan_file)
+
+
+class _LoadState(object):
+    """
+    Settings of one load while compiling, since 0x90 and 0x92 frames
+    always carry the full set of parameters or flags.
+    """
+    def __init__(self, bus, address, max_current=None, max_power=None, clock_factor=1.0):
+        self.bus = bus
+        self.address = address
+        self.clock_factor = float(clock_factor)
+        if self.clock_factor <= 0:
+            raise ValueError("clock_factor must be positive")
+        # Unknown limits are None, until set by the plan
+        self.max_current = None
+        self.max_power = None
+        if max_current is not None:
+            self.max_current = Load.to_load_units('max_current', max_current)
+        if max_power is not None:
+            self.max_power = Load.to_load_units('max_power', max_power)
+        self.load_mode = Load.SET_TYPE_RESISTANCE
+        self.load_value = Load.to_load_units('resistance', 500)
+        self.remote_control = 0
+        self.load_on = 0
+
+    def set_parameters_frame(self):
+        if self.max_current is None or self.max_power is None:
+            raise ValueError("0x90 frames carry max_current and max_power, set both in the load definition")
+        return Load.build_frame(self.address, Load.CMD_SET_PARAMETERS, lambda out_buffer:
+                                Load.STRUCT_SET_PARAMETERS.pack_into(
+                                    out_buffer, Load.OFFSET_PAYLOAD, self.max_current, self.max_power,
+                                    self.address, self.load_mode, self.load_value))
+
+    def load_state_frame(self):
+        flags = self.remote_control << 1 | self.load_on
+        return Load.build_frame(self.address, Load.CMD_LOAD_STATE, lambda out_buffer:
+                                Load.STRUCT_LOAD_STATE.pack_into(out_buffer, Load.OFFSET_PAYLOAD, flags))
+
+
+class CompiledPlan(object):
+    """
+    Timeline of pre-encoded frames, per bus, in send order
+    """
+
+    def __init__(self, entries):
+        entries = sorted(entries, key=lambda entry: entry.time)
+        self.timeline = collections.OrderedDict()
+        for entry in entries:
+            self.timeline.setdefault(entry.bus, []).append(entry)
+
+    @property
+    def duration(self):
+        return max([entries[-1].time for entries in self.timeline.values()] or [0])
+
+    @staticmethod
+    def wire_time(entry, baudrate):
+        """
+        Time bus is busy for an entry: the frame, plus the response for 0x91
+        """
+        frames = 2 if entry.command == Load.CMD_READ_VALUES else 1
+        return frames * Load.FRAME_LENGTH * BITS_PER_BYTE / baudrate
+
+    def occupancy(self, baudrate=9600, window=1.0):
+        """
+        Estimates bus occupancy of plan.
+
+        :param baudrate: Baud rate of buses
+        :param window: Length in seconds of windows for peak occupancy
+        :return: dict of bus -> dict of busy_time, mean, peak (fraction of window busy)
+                 and late (frames that can't be sent on time because bus is still busy)
+        """
+        results = collections.OrderedDict()
+        for bus, entries in self.timeline.items():
+            busy_time = 0.0
+            windows = collections.defaultdict(float)
+            bus_free = 0.0
+            late = 0
+            for entry in entries:
+                wire_time = self.wire_time(entry, baudrate)
+                if entry.time < bus_free:
+                    late += 1
+                bus_free = max(bus_free, entry.time) + wire_time
+                busy_time += wire_time
+                windows[int(entry.time // window)] += wire_time
+            results[bus] = {'busy_time': busy_time,
+                            'mean': busy_time / max(self.duration, window),
+                            'peak': max(windows.values() or [0]) / window,
+                            'late': late}
+        return results
+
+    def check_capacity(self, baudrate=9600, window=1.0, max_occupancy=0.8):
+        """
+        Raises PlanError if a bus is busier than max_occupancy in any window.
+        """
+        for bus, result in self.occupancy(baudrate, window).items():
+            if result['peak'] > max_occupancy:
+                raise PlanError("Bus {} peak occupancy {:.0%} at {} baud exceeds {:.0%}".format(
+                    bus, result['peak'], baudrate, max_occupancy))
+
+
+def compile_plan(plan):
+    """
+    Validates a plan and encodes all frames.
+
+    :param plan: plan dict, see module documentation
+    :return: CompiledPlan
+    """
+    states = {}
+    for name, config in plan.get('loads', {}).items():
+        try:
+            states[name] = _LoadState(config.get('bus', 0), config['address'],
+                                      config.get('max_current'), config.get('max_power'),
+                                      config.get('clock_factor', 1.0))
+        except (KeyError, ValueError) as err:
+            raise PlanError("Load {}: {}".format(name, err))
+
+    # (time, step index, step) of every step and repeat
+    occurrences = []
+    cursor = 0.0
+    for ind, step in enumerate(plan.get('steps', [])):
+        try:
+            if 'wait' in step:
+                cursor += float(step['wait'])
+                continue
+            start = float(step.get('at', cursor))
+            cursor = start
+            if step.get('load') not in states:
+                raise ValueError("Unknown load {}".format(step.get('load')))
+            times = [start]
+            if 'every' in step:
+                every = float(step['every'])
+                if every <= 0:
+                    raise ValueError("every must be positive")
+                count = int((float(step['until']) - start) / every + 1e-9)
+                times = [start + every * repeat for repeat in range(count + 1)]
+        except (KeyError, ValueError, TypeError) as err:
+            raise PlanError("Step {} {}: {}".format(ind, step, err))
+        occurrences.extend((step_time, ind, step) for step_time in times)
+
+    # Load state must follow send order, since 0x90 and 0x92 frames carry all settings.
+    entries = []
+    for step_time, ind, step in sorted(occurrences, key=lambda occurrence: occurrence[:2]):
+        state = states[step['load']]
+        try:
+            frames = _encode_step(state, step)
+        except (KeyError, ValueError, IndexError, TypeError, struct.error) as err:
+            raise PlanError("Step {} {}: {}".format(ind, step, err))
+        for command, frame in frames:
+            entries.append(TimelineEntry(step_time, state.bus, state.address, command, frame))
+    return CompiledPlan(entries)
+
+
+def _encode_step(state, step):
+    """
+    Applies a step to load state and encodes its frames.
+
+    :return: list of (command, frame)
+    """
+    frames = []
+    parameters = False
+    for name in ('max_current', 'max_power'):
+        if name in step:
+            setattr(state, name, Load.to_load_units(name, step[name]))
+            parameters = True
+    for name, set_type in SET_TYPES.items():
+        if name in step:
+            state.load_value = Load.to_load_units(name, step[name])
+            state.load_mode = set_type
+            parameters = True
+    if parameters:
+        frames.append((Load.CMD_SET_PARAMETERS, state.set_parameters_frame()))
+    if 'remote_control' in step or 'load_on' in step:
+        state.remote_control = 1 if step.get('remote_control', state.remote_control) else 0
+        state.load_on = 1 if step.get('load_on', state.load_on) else 0
+        frames.append((Load.CMD_LOAD_STATE, state.load_state_frame()))
+    if 'program' in step:
+        config = step['program']
+        program = Program(PROGRAM_TYPES[config.get('type', 'current')], PROGRAM_MODES[config.get('mode', 'once')])
+        for setting, duration in config['steps']:
+            program.add_step(setting, duration)
+        frames.append((Load.CMD_DEFINE_PROG_1_5,
+                       Load.build_frame(state.address, Load.CMD_DEFINE_PROG_1_5, lambda out_buffer:
+                                        program.load_buffer_one_to_five(out_buffer, state.clock_factor))))
+        frames.append((Load.CMD_DEFINE_PROG_6_10,
+                       Load.build_frame(state.address, Load.CMD_DEFINE_PROG_6_10, lambda out_buffer:
+                                        program.load_buffer_six_to_ten(out_buffer, state.clock_factor))))
+    if step.get('start_program'):
+        frames.append((Load.CMD_START_PROG, Load.build_frame(state.address, Load.CMD_START_PROG)))
+    if step.get('stop_program'):
+        frames.append((Load.CMD_STOP_PROG, Load.build_frame(state.address, Load.CMD_STOP_PROG)))
+    if step.get('status'):
+        frames.append((Load.CMD_READ_VALUES, Load.build_frame(state.address, Load.CMD_READ_VALUES)))
+    if not frames:
+        raise ValueError("Step has no action")
+    return frames
+
+
+class PlanRunner(object):
+    """
+    Sends a compiled plan, one thread per bus.
+    """
+
+    def __init__(self, compiled_plan, buses, on_status=None):
+        """
+        :param compiled_plan: CompiledPlan
+        :param buses: dict of bus name in plan -> serial connection
+        :param on_status: Called with (entry, response bytes) for each 0x91
+        :return: None
+        """
+        self.plan = compiled_plan
+        self.buses = buses
+        self.on_status = on_status
+        self.max_lateness = 0.0
+        self.__lock = threading.Lock()
+
+    def __run_bus(self, serial_connection, entries, start):
+        max_lateness = 0.0
+        for entry in entries:
+            delay = start + entry.time - monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lateness = max(max_lateness, -delay)
+            serial_connection.write(entry.frame)
+            if entry.command == Load.CMD_READ_VALUES:
+                response = serial_connection.read(Load.FRAME_LENGTH)
+                if self.on_status is not None:
+                    self.on_status(entry, response)
+        with self.__lock:
+            self.max_lateness = max(self.max_lateness, max_lateness)
+
+    def run(self):
+        """
+        Runs plan and returns when all buses are done.
+        """
+        missing = set(self.plan.timeline) - set(self.buses)
+        if missing:
+            raise PlanError("No serial connection for buses: {}".format(", ".join(str(bus) for bus in missing)))
+        start = monotonic()
+        threads = [threading.Thread(target=self.__run_bus, args=(self.buses[bus], entries, start))
+                   for bus, entries in self.plan.timeline.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
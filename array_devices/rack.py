@@ -0,0 +1,78 @@
+"""
+Bulk setup of many loads across several buses.
+
+create_loads builds Load objects without any serial IO, and connect fetches
+the initial status of all of them in one sweep, with buses swept in parallel.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import threading
+
+from .array3710 import Load
+
+__author__ = 'Joe Sacher'
+
+ConnectResult = collections.namedtuple('ConnectResult', 'connected unreachable')
+
+
+def create_loads(buses, load_class=Load, print_errors=False):
+    """
+    Creates lazy Load objects, without any serial IO.
+
+    :param buses: Iterable of (serial_connection, addresses) pairs
+    :param load_class: Load class to create
+    :param print_errors: print_errors setting of created loads
+    :return: list of loads, in order given
+    """
+    return [load_class(address, serial_connection, print_errors=print_errors, lazy=True)
+            for serial_connection, addresses in buses
+            for address in addresses]
+
+
+def group_by_bus(loads):
+    """
+    Groups loads by serial connection, keeping order.
+
+    :param loads: Iterable of Load objects
+    :return: list of lists of loads sharing a serial connection
+    """
+    buses = collections.OrderedDict()
+    for load in loads:
+        buses.setdefault(id(load.serial), []).append(load)
+    return list(buses.values())
+
+
+def connect(loads, retry_count=0):
+    """
+    Fetches initial status of all loads.
+
+    Loads on one bus are polled in turn, while each bus is swept by its own
+    thread.  Total time is about that of the slowest bus sweep.
+
+    :param loads: Iterable of Load objects, usually created lazily
+    :param retry_count: retry_count passed to update_status
+    :return: ConnectResult of connected loads (list) and unreachable loads (dict of load -> IOError)
+    """
+    loads = list(loads)
+    unreachable = {}
+    lock = threading.Lock()
+
+    def sweep(bus_loads):
+        for load in bus_loads:
+            try:
+                load.update_status(retry_count=retry_count)
+            except IOError as err:
+                with lock:
+                    unreachable[load] = err
+
+    threads = [threading.Thread(target=sweep, args=(bus_loads,)) for bus_loads in group_by_bus(loads)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    connected = [load for load in loads if load not in unreachable]
+    return ConnectResult(connected, unreachable)
@@ -0,0 +1,123 @@
+"""
+Slew rate limited setpoint ramps.
+
+A ramp moves a load from a start to an end setpoint at a requested rate
+(A/s, W/s or ohms/s).  The number of updates is the smaller of the setpoint
+resolution steps and what the bus can carry, all 0x90 frames are encoded
+before the ramp starts, and they are sent at scheduled times without
+reading status in between.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import time
+
+from .array3710 import Load, monotonic
+
+__author__ = 'Joe Sacher'
+
+BITS_PER_BYTE = 10
+
+RampResult = collections.namedtuple(
+    'RampResult', 'setpoint start end requested_slew achieved_slew updates duration max_lateness')
+
+
+def slew_error(result):
+    """
+    Relative error of achieved slope, ex: 0.02 for 2% too fast
+    """
+    return result.achieved_slew / result.requested_slew - 1
+
+
+def bus_rate(serial_connection, bus_share=0.8):
+    """
+    Estimated 0x90 frames per second a bus can carry for a ramp.
+
+    :param serial_connection: Serial connection, its baudrate and frame_gap (PacedSerial) are used
+    :param bus_share: Fraction of bus time the ramp may use
+    :return: frames per second
+    """
+    frame_time = Load.FRAME_LENGTH * BITS_PER_BYTE / getattr(serial_connection, 'baudrate', 9600)
+    return bus_share / (frame_time + getattr(serial_connection, 'frame_gap', 0.0))
+
+
+def plan_ramp(load, setpoint, start, end, slew, rate):
+    """
+    Times and setpoints of a ramp.
+
+    :param load: Load, for calibration
+    :param setpoint: 'current', 'power' or 'resistance'
+    :param start: Start setpoint in Amps, Watts or Ohms
+    :param end: End setpoint
+    :param slew: Rate of change in units per second, positive
+    :param rate: Setpoint updates per second the bus can carry
+    :return: list of (time from start of ramp, setpoint in public units, setpoint in load units)
+    """
+    if setpoint not in Load.SET_TYPE_NAMES.values():
+        raise ValueError("Can't ramp {}".format(setpoint))
+    if slew <= 0:
+        raise ValueError("Slew rate must be positive")
+    multiplier = Load.SETPOINTS[setpoint][0]
+    duration = abs(end - start) / slew
+    # No point sending more updates than there are resolution steps, or than the bus can carry
+    levels = int(round(abs(end - start) * multiplier))
+    updates = max(1, min(levels, int(duration * rate)))
+    points = []
+    for ind in range(updates + 1):
+        value = start + (end - start) * ind / updates
+        points.append((duration * ind / updates, value, load.setpoint_units(setpoint, value)))
+    return points
+
+
+def _slope(times, values):
+    count = len(times)
+    mean_time = sum(times) / count
+    mean_value = sum(values) / count
+    variance = sum((t - mean_time) ** 2 for t in times)
+    if not variance:
+        return 0.0
+    return sum((t - mean_time) * (v - mean_value) for t, v in zip(times, values)) / variance
+
+
+def ramp(load, setpoint, start, end, slew, rate=None, update_status=True):
+    """
+    Ramps a load setpoint at a fixed slew rate.  Blocks until ramp is done.
+
+    Only 0x90 frames are sent during the ramp, so load values are not updated
+    until the end.  Achieved slew is the least squares slope of setpoints
+    against the times they were actually written.
+
+    :param load: Load
+    :param setpoint: 'current', 'power' or 'resistance'
+    :param start: Start setpoint in Amps, Watts or Ohms
+    :param end: End setpoint
+    :param slew: Rate of change in units per second, ex: 0.5 A/s
+    :param rate: Setpoint updates per second allowed on the bus, ex: measured
+                 commands_per_second from baudrate.lookup.  Defaults to bus_rate(load.serial).
+    :param update_status: True to read load status after ramp
+    :return: RampResult
+    """
+    if rate is None:
+        rate = bus_rate(load.serial)
+    points = plan_ramp(load, setpoint, start, end, slew, rate)
+    load_mode = dict((name, set_type) for set_type, name in Load.SET_TYPE_NAMES.items())[setpoint]
+    frames = [load.set_parameters_frame(load_mode, value) for _, _, value in points]
+
+    sent_times = []
+    max_lateness = 0.0
+    ramp_start = monotonic()
+    for (offset, _, _), frame in zip(points, frames):
+        delay = ramp_start + offset - monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            max_lateness = max(max_lateness, -delay)
+        load.send_frame(frame)
+        sent_times.append(monotonic() - ramp_start)
+    if update_status:
+        load.update_status()
+
+    achieved = abs(_slope(sent_times, [value for _, value, _ in points]))
+    return RampResult(setpoint, start, end, slew, achieved, len(points) - 1, sent_times[-1], max_lateness)
@@ -0,0 +1,179 @@
+"""
+Detection of, and recovery from, a wedged bus.
+
+Under a packet storm loads stop answering and don't recover until traffic
+pauses, so a polling loop that keeps retrying fails forever.
+RecoveringSerial watches status transactions, and when consecutive
+requests to several addresses fail it holds back all traffic, drains the
+input, waits a quiet interval and probes with 0x91 until a load answers.
+Writes that arrived meanwhile then go out in order.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import threading
+import time
+
+from .array3710 import Load, byte2int, monotonic
+from .tracing import span
+
+__author__ = 'Joe Sacher'
+
+STATE_HEALTHY = 'healthy'
+STATE_SUSPECT = 'suspect'
+STATE_WEDGED = 'wedged'
+STATE_RECOVERING = 'recovering'
+
+Recovery = collections.namedtuple('Recovery', 'started duration probes addresses')
+
+
+def _valid_response(read_string, address):
+    if len(read_string) != Load.FRAME_LENGTH:
+        return False
+    if byte2int(read_string[0]) != 0xAA or byte2int(read_string[1]) != address:
+        return False
+    return sum(bytearray(read_string[:-1])) % 256 == byte2int(read_string[-1])
+
+
+class RecoveringSerial(object):
+    """
+    Wraps a serial connection and recovers the bus when loads stop answering.
+
+    All other attributes are passed through to wrapped connection.
+    """
+
+    def __init__(self, serial_connection, failure_threshold=3, min_addresses=2, quiet_interval=1.0,
+                 max_quiet_interval=30.0, max_probes=20, max_recovery_time=300.0, on_recovery=None,
+                 tracer=None):
+        """
+        :param serial_connection: Serial connection
+        :param failure_threshold: Consecutive failed status requests that mark the bus wedged
+        :param min_addresses: Different addresses that must have failed, so one dead load
+                              doesn't stop the bus.  Limited to number of addresses seen.
+        :param quiet_interval: Seconds without traffic before first probe
+        :param max_quiet_interval: Quiet interval doubles after each failed probe, up to this
+        :param max_probes: Probes before giving up with IOError, None for no limit
+        :param max_recovery_time: Seconds before giving up with IOError, None for no limit.
+                                  The bus is held during recovery, so at least one limit is required.
+        :param on_recovery: Called with Recovery after bus recovered
+        :param tracer: tracing.Tracer recording recoveries, or None
+        :return: None
+        """
+        if max_probes is None and max_recovery_time is None:
+            raise ValueError("max_probes or max_recovery_time is required")
+        self.serial = serial_connection
+        self.failure_threshold = failure_threshold
+        self.min_addresses = min_addresses
+        self.quiet_interval = quiet_interval
+        self.max_quiet_interval = max_quiet_interval
+        self.max_probes = max_probes
+        self.max_recovery_time = max_recovery_time
+        self.on_recovery = on_recovery
+        self.tracer = tracer
+        self.state = STATE_HEALTHY
+        self.consecutive_failures = 0
+        self.recoveries = []
+        self.__failed_addresses = set()
+        self.__known_addresses = set()
+        self.__pending_address = None
+        self.__lock = threading.RLock()
+
+    def write(self, data_str):
+        with self.__lock:
+            if self.state == STATE_WEDGED:
+                self.recover()
+            self.__pending_address = None
+            if byte2int(data_str[2]) == Load.CMD_READ_VALUES:
+                self.__pending_address = byte2int(data_str[1])
+            return self.serial.write(data_str)
+
+    def read(self, length=1):
+        with self.__lock:
+            read_string = self.serial.read(length)
+            address, self.__pending_address = self.__pending_address, None
+            if address is not None:
+                if _valid_response(read_string, address):
+                    self.__known_addresses.add(address)
+                    self.__record_success()
+                else:
+                    self.__record_failure(address)
+            return read_string
+
+    def __record_success(self):
+        self.consecutive_failures = 0
+        self.__failed_addresses.clear()
+        self.state = STATE_HEALTHY
+
+    def __record_failure(self, address):
+        self.consecutive_failures += 1
+        self.__failed_addresses.add(address)
+        required = max(min(self.min_addresses, len(self.__known_addresses | self.__failed_addresses)), 1)
+        if self.consecutive_failures >= self.failure_threshold and len(self.__failed_addresses) >= required:
+            self.state = STATE_WEDGED
+        else:
+            self.state = STATE_SUSPECT
+
+    def __drain(self):
+        if hasattr(self.serial, 'reset_input_buffer'):
+            self.serial.reset_input_buffer()
+        elif hasattr(self.serial, 'flushInput'):
+            self.serial.flushInput()
+
+    def __probe(self, address):
+        self.serial.write(Load.build_frame(address, Load.CMD_READ_VALUES))
+        return _valid_response(self.serial.read(Load.FRAME_LENGTH), address)
+
+    def recover(self):
+        """
+        Stops traffic until a load answers a status request.
+        Called automatically by the next write once the bus is wedged.
+        Raises IOError once max_probes or max_recovery_time is reached,
+        leaving the bus wedged so the next write tries again.
+
+        :return: Recovery
+        """
+        with self.__lock, span(self.tracer, 'recover', self) as recover_span:
+            self.state = STATE_RECOVERING
+            addresses = sorted(self.__known_addresses | self.__failed_addresses)
+            if not addresses:
+                self.state = STATE_WEDGED
+                raise IOError("No load addresses seen to probe")
+            started = monotonic()
+            quiet_interval = self.quiet_interval
+            probes = 0
+            while True:
+                self.__drain()
+                time.sleep(quiet_interval)
+                self.__drain()
+                responded = False
+                for address in addresses:
+                    probes += 1
+                    recover_span.set(probes=probes)
+                    if self.__probe(address):
+                        responded = True
+                        break
+                if responded:
+                    break
+                if self.max_probes is not None and probes >= self.max_probes:
+                    self.state = STATE_WEDGED
+                    raise IOError("Bus did not recover after {} probes".format(probes))
+                quiet_interval = min(quiet_interval * 2, self.max_quiet_interval)
+                elapsed = monotonic() - started
+                if self.max_recovery_time is not None and elapsed + quiet_interval > self.max_recovery_time:
+                    self.state = STATE_WEDGED
+                    raise IOError("Bus did not recover in {:.1f}s".format(elapsed))
+            recovery = Recovery(started, monotonic() - started, probes, tuple(addresses))
+            self.recoveries.append(recovery)
+            self.__record_success()
+        if self.on_recovery is not None:
+            self.on_recovery(recovery)
+        return recovery
+
+    @property
+    def total_recovery_time(self):
+        return sum(recovery.duration for recovery in self.recoveries)
+
+    def __getattr__(self, name):
+        return getattr(self.serial, name)
@@ -0,0 +1,185 @@
+"""
+Replay of recorded bus traffic.
+
+ReplaySerial answers reads from a capture file recorded with
+array_devices.capture, so Load code can be rerun against a field failure
+or used to benchmark decoding without hardware.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import binascii
+import collections
+import time
+
+from .array3710 import monotonic
+from .capture import CaptureReader, DIRECTION_TX, DIRECTION_RX
+
+__author__ = 'Joe Sacher'
+
+Divergence = collections.namedtuple('Divergence', 'record_index expected actual')
+
+
+class ReplayDivergence(Exception):
+    """
+    Raised when a written frame does not match the recorded frame.
+
+    Not an IOError, so Load retries do not hide it.
+    """
+    def __init__(self, divergence):
+        self.divergence = divergence
+        expected = divergence.expected
+        if expected is not None:
+            expected = binascii.hexlify(expected)
+        super(ReplayDivergence, self).__init__(
+            "Write diverged from capture at record {}: expected {} got {}".format(
+                divergence.record_index, expected, binascii.hexlify(divergence.actual)))
+
+
+class ReplaySerial(object):
+    """
+    Serial compatible object that replays a capture file.
+
+    Writes are checked against recorded TX frames, reads return the
+    recorded RX frames that followed them.  Can be passed to Load in place
+    of the serial connection, like SerialTester.
+    """
+
+    def __init__(self, capture, bus_id=None, realtime=False, strict=True):
+        """
+        :param capture: CaptureReader or path of capture file
+        :param bus_id: Only replay records of this bus.  None replays all.
+        :param realtime: True to delay reads to recorded timing,
+                         False to replay as fast as possible.
+        :param strict: True raises ReplayDivergence on mismatched writes,
+                       False stores them in divergences and continues.
+        :return: None
+        """
+        # Reader opened here is closed with close()
+        self.__owns_capture = not isinstance(capture, CaptureReader)
+        if self.__owns_capture:
+            capture = CaptureReader(capture)
+        self.capture = capture
+        self.bus_id = bus_id
+        self.realtime = realtime
+        self.strict = strict
+        self.divergences = []
+        self.timeout = 0
+        self.__position = 0
+        self.__pending = b''
+        self.__start_record = None
+        self.__start_local = None
+
+    @property
+    def position(self):
+        """
+        Index of next capture record to be replayed
+        """
+        return self.__position
+
+    @property
+    def finished(self):
+        """
+        True when all records have been replayed
+        """
+        return self.__next_index() is None
+
+    def __next_index(self):
+        """
+        Index of next record on replayed bus, or None at end of capture
+        """
+        index = self.__position
+        while index < len(self.capture):
+            if self.bus_id is None or self.capture[index].bus_id == self.bus_id:
+                return index
+            index += 1
+        return None
+
+    def __wait_for(self, timestamp):
+        """
+        Sleeps until recorded timestamp is reached on local clock, in realtime mode
+        """
+        if self.__start_record is None:
+            self.__start_record = timestamp
+            self.__start_local = monotonic()
+        if not self.realtime:
+            return
+        delay = (timestamp - self.__start_record) - (monotonic() - self.__start_local)
+        if delay > 0:
+            time.sleep(delay)
+
+    def __diverge(self, record_index, expected, actual):
+        divergence = Divergence(record_index, expected, actual)
+        if self.strict:
+            raise ReplayDivergence(divergence)
+        self.divergences.append(divergence)
+
+    def write(self, data_str):
+        """
+        Checks data against next recorded TX frame.
+        Recorded reads that were never consumed are skipped.
+
+        :param data_str: string to write
+        :return: number of bytes given
+        """
+        data_str = bytes(data_str)
+        self.__pending = b''
+        index = self.__next_index()
+        while index is not None and self.capture[index].direction != DIRECTION_TX:
+            self.__position = index + 1
+            index = self.__next_index()
+        if index is None:
+            self.__diverge(len(self.capture), None, data_str)
+            return len(data_str)
+        record = self.capture[index]
+        self.__position = index + 1
+        self.__wait_for(record.timestamp)
+        if record.data != data_str:
+            self.__diverge(index, record.data, data_str)
+        return len(data_str)
+
+    def read(self, length=1):
+        """
+        Returns recorded RX data following the last write.
+        Returns empty string (a timeout) if the recording has no
+        read at this point.
+
+        :param length: length to read
+        :return: byte_string
+        """
+        response = b''
+        while len(response) < length:
+            if not self.__pending:
+                index = self.__next_index()
+                if index is None or self.capture[index].direction != DIRECTION_RX:
+                    break
+                record = self.capture[index]
+                self.__position = index + 1
+                self.__wait_for(record.timestamp)
+                self.__pending = record.data
+                if not self.__pending:
+                    # Recorded timeout
+                    break
+            needed = length - len(response)
+            response += self.__pending[:needed]
+            self.__pending = self.__pending[needed:]
+        return response
+
+    def rewind(self):
+        """
+        Restarts replay from first record
+        """
+        self.__position = 0
+        self.__pending = b''
+        self.__start_record = None
+        self.__start_local = None
+        self.divergences = []
+
+    def close(self):
+        """
+        Closes capture file, if it was opened from a path
+        """
+        if self.__owns_capture:
+            self.capture.close()
+            self.__owns_capture = False
@@ -0,0 +1,247 @@
+"""
+Priority scheduling of frames on a shared bus.
+
+BusScheduler owns a serial connection and sends frames from all Loads on
+the bus in priority order, so a safety command (load off, stop program)
+never waits behind queued telemetry polls.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import heapq
+import itertools
+import threading
+import time
+
+from .array3710 import Load, byte2int, monotonic
+
+__author__ = 'Joe Sacher'
+
+# Priority classes, lowest value is sent first
+PRIORITY_SAFETY = 0
+PRIORITY_CONTROL = 1
+PRIORITY_TELEMETRY = 2
+
+PRIORITY_NAMES = ('safety', 'control', 'telemetry')
+
+PREEMPT_DEFER = 'defer'
+PREEMPT_DROP = 'drop'
+
+
+def classify_frame(frame):
+    """
+    Priority class of a frame from its command.
+
+    Load off (0x92 without load on bit) and stop program (0x96) are safety,
+    status reads (0x91) are telemetry, everything else is control.
+
+    :param frame: 26 byte frame
+    :return: PRIORITY_SAFETY, PRIORITY_CONTROL or PRIORITY_TELEMETRY
+    """
+    command = byte2int(frame[2])
+    if command == Load.CMD_STOP_PROG:
+        return PRIORITY_SAFETY
+    if command == Load.CMD_LOAD_STATE and not byte2int(frame[3]) & 0b00000001:
+        return PRIORITY_SAFETY
+    if command == Load.CMD_READ_VALUES:
+        return PRIORITY_TELEMETRY
+    return PRIORITY_CONTROL
+
+
+class QueueStats(object):
+    """
+    Queueing delay statistics for one priority class (seconds)
+    """
+    def __init__(self):
+        self.count = 0
+        self.dropped = 0
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+
+    @property
+    def mean_delay(self):
+        if not self.count:
+            return 0.0
+        return self.total_delay / self.count
+
+    def add(self, delay):
+        self.count += 1
+        self.total_delay += delay
+        self.max_delay = max(self.max_delay, delay)
+
+    def __repr__(self):
+        return "QueueStats(count={}, dropped={}, mean_delay={:.6f}, max_delay={:.6f})".format(
+            self.count, self.dropped, self.mean_delay, self.max_delay)
+
+
+class _Request(object):
+    def __init__(self, frame, priority):
+        self.frame = frame
+        self.priority = priority
+        self.queued = monotonic()
+        self.event = threading.Event()
+        self.bytes_written = 0
+        self.response = b''
+        self.error = None
+
+
+class BusScheduler(object):
+    """
+    Serial compatible priority scheduler for one bus.
+
+    Pass to Load in place of the serial connection.  write() queues the
+    frame and blocks until a worker thread has sent it (and read the
+    response for 0x91).  read() returns that response to the calling thread.
+    """
+
+    # Responses go to the thread that wrote the request, so Load needs no
+    # transaction lock, see array3710.transaction_lock.
+    serializes_transactions = True
+
+    def __init__(self, serial_connection, preempt=PREEMPT_DEFER, frame_gap=0.0):
+        """
+        :param serial_connection: Serial Connection from serial.Serial()
+        :param preempt: PREEMPT_DEFER keeps telemetry queued behind higher priority frames,
+                        PREEMPT_DROP discards queued telemetry when a safety frame arrives.
+        :param frame_gap: Quiet time in seconds after each transaction
+        :return: None
+        """
+        if preempt not in (PREEMPT_DEFER, PREEMPT_DROP):
+            raise ValueError("Illegal preempt policy")
+        self.serial = serial_connection
+        self.preempt = preempt
+        self.frame_gap = frame_gap
+        self.stats = tuple(QueueStats() for _ in PRIORITY_NAMES)
+        self.__queue = []
+        self.__sequence = itertools.count()
+        self.__condition = threading.Condition()
+        self.__local = threading.local()
+        self.__running = True
+        self.__worker = threading.Thread(target=self.__run)
+        self.__worker.daemon = True
+        self.__worker.start()
+
+    @property
+    def timeout(self):
+        return getattr(self.serial, 'timeout', None)
+
+    def frame_time(self):
+        """
+        Time on wire of one frame at bus baud rate (10 bits per byte)
+        """
+        return Load.FRAME_LENGTH * 10 / getattr(self.serial, 'baudrate', 9600)
+
+    def worst_case_latency(self):
+        """
+        Worst case time from a safety frame being queued to it being on the wire,
+        when no other safety frame is ahead of it.
+
+        The frame waits at most for one transaction in progress: a status
+        request, response timeout and frame gap.  Then it is sent.
+        """
+        timeout = self.timeout or 0
+        return self.frame_time() + timeout + self.frame_gap + self.frame_time()
+
+    def submit(self, frame, priority=None):
+        """
+        Queues a frame and waits for it to be sent.
+
+        :param frame: 26 byte frame
+        :param priority: Priority class, or None to classify by command
+        :return: (bytes_written, response)
+        """
+        if priority is None:
+            priority = getattr(self.__local, 'priority', None)
+        if priority is None:
+            priority = classify_frame(frame)
+        request = _Request(bytes(frame), priority)
+        with self.__condition:
+            if not self.__running:
+                raise IOError("Scheduler is closed")
+            if priority == PRIORITY_SAFETY and self.preempt == PREEMPT_DROP:
+                self.__drop_telemetry()
+            heapq.heappush(self.__queue, (priority, next(self.__sequence), request))
+            self.__condition.notify()
+        request.event.wait()
+        if request.error is not None:
+            raise request.error
+        return request.bytes_written, request.response
+
+    def priority(self, priority):
+        """
+        Context manager forcing a priority class for frames written by this thread.
+
+        with scheduler.priority(PRIORITY_SAFETY):
+            load.set_load_current(0)
+        """
+        return _PriorityOverride(self.__local, priority)
+
+    def __drop_telemetry(self):
+        """
+        Removes queued telemetry, completing it as a timed out read.
+        Condition must be held.
+        """
+        kept = []
+        for entry in self.__queue:
+            request = entry[2]
+            if request.priority == PRIORITY_TELEMETRY:
+                self.stats[PRIORITY_TELEMETRY].dropped += 1
+                request.bytes_written = len(request.frame)
+                request.event.set()
+            else:
+                kept.append(entry)
+        heapq.heapify(kept)
+        self.__queue = kept
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while self.__running and not self.__queue:
+                    self.__condition.wait()
+                if not self.__queue:
+                    return
+                request = heapq.heappop(self.__queue)[2]
+            self.stats[request.priority].add(monotonic() - request.queued)
+            try:
+                request.bytes_written = self.serial.write(request.frame)
+                if byte2int(request.frame[2]) == Load.CMD_READ_VALUES:
+                    request.response = self.serial.read(Load.FRAME_LENGTH)
+            except Exception as err:
+                request.error = err
+            request.event.set()
+            if self.frame_gap:
+                time.sleep(self.frame_gap)
+
+    def write(self, data_str):
+        bytes_written, self.__local.response = self.submit(data_str)
+        return bytes_written
+
+    def read(self, length=1):
+        response = getattr(self.__local, 'response', b'')
+        self.__local.response = response[length:]
+        return response[:length]
+
+    def close(self):
+        """
+        Stops worker after queued frames are sent.  Does not close serial connection.
+        """
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+        self.__worker.join()
+
+
+class _PriorityOverride(object):
+    def __init__(self, local, priority):
+        self.local = local
+        self.priority = priority
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = getattr(self.local, 'priority', None)
+        self.local.priority = self.priority
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.local.priority = self.previous
@@ -0,0 +1,270 @@
+"""
+Shared memory ring buffer of status samples.
+
+One process polls the loads and publishes samples into a ring in
+multiprocessing.shared_memory.  Any number of processes attach a RingReader
+and read samples straight out of shared memory, without extra bus traffic
+or sockets.
+
+The ring has a single writer and no locks.  Each slot carries the number of
+the sample in it, which is cleared while the slot is rewritten, so readers
+detect samples that were overwritten while being read.
+
+Requires Python 3.8 or later.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import struct
+import threading
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+from .array3710 import monotonic
+from .telemetry import StatusSample, sample_from_status
+
+__author__ = 'Joe Sacher'
+
+
+class RingFormat(object):
+    """
+    Description of ring structures in shared memory
+    """
+    MAGIC = 0x41333731
+    # magic, capacity, samples published
+    STRUCT_HEADER = struct.Struct(b'< 2I Q')
+    # sample number + 1 (0 while writing), timestamp, voltage, current, power,
+    # max_current, max_power, resistance, address, state
+    STRUCT_SLOT = struct.Struct(b'< Q d I 5H 2B')
+    STRUCT_SEQUENCE = struct.Struct(b'< Q')
+
+    OFFSET_PUBLISHED = 8
+    HEADER_SIZE = STRUCT_HEADER.size
+    SLOT_SIZE = STRUCT_SLOT.size
+
+    @classmethod
+    def size(cls, capacity):
+        return cls.HEADER_SIZE + capacity * cls.SLOT_SIZE
+
+    @classmethod
+    def slot_offset(cls, capacity, number):
+        return cls.HEADER_SIZE + (number % capacity) * cls.SLOT_SIZE
+
+
+def _require_shared_memory():
+    if shared_memory is None:
+        raise ImportError("multiprocessing.shared_memory requires Python 3.8 or later")
+
+
+class TelemetryRing(object):
+    """
+    Writer side of the ring.  Creates the shared memory block.
+    """
+
+    def __init__(self, name=None, capacity=65536):
+        """
+        :param name: Shared memory name readers attach to, or None for a generated name
+        :param capacity: Number of samples kept
+        :return: None
+        """
+        _require_shared_memory()
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=RingFormat.size(capacity))
+        self.name = self.shm.name
+        self.__buffer = self.shm.buf
+        self.__buffer[:RingFormat.size(capacity)] = bytes(RingFormat.size(capacity))
+        RingFormat.STRUCT_HEADER.pack_into(self.__buffer, 0, RingFormat.MAGIC, capacity, 0)
+        self.published = 0
+        self.__lock = threading.Lock()
+
+    def publish(self, sample):
+        """
+        Writes a sample into the next slot, overwriting the oldest sample.
+
+        :param sample: StatusSample
+        :return: sample number
+        """
+        with self.__lock:
+            number = self.published
+            offset = RingFormat.slot_offset(self.capacity, number)
+            RingFormat.STRUCT_SEQUENCE.pack_into(self.__buffer, offset, 0)
+            RingFormat.STRUCT_SLOT.pack_into(
+                self.__buffer, offset, 0, sample.timestamp, sample.voltage, sample.current, sample.power,
+                sample.max_current, sample.max_power, sample.resistance, sample.address, sample.state)
+            RingFormat.STRUCT_SEQUENCE.pack_into(self.__buffer, offset, number + 1)
+            self.published = number + 1
+            RingFormat.STRUCT_SEQUENCE.pack_into(self.__buffer, RingFormat.OFFSET_PUBLISHED, self.published)
+        return number
+
+    def close(self, unlink=True):
+        """
+        Releases shared memory.  Unlinking removes it for readers too.
+        """
+        self.__buffer = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RingReader(object):
+    """
+    Reader side of the ring.  Attaches to shared memory of a TelemetryRing.
+    """
+
+    def __init__(self, name, from_start=False):
+        """
+        :param name: Shared memory name of ring
+        :param from_start: True to start with oldest sample in ring, False for only new samples
+        :return: None
+        """
+        _require_shared_memory()
+        try:
+            # Readers must not unlink the ring on exit.
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers with the resource tracker,
+            # which would unlink the ring when this process exits.
+            from multiprocessing import resource_tracker
+            register = resource_tracker.register
+            resource_tracker.register = lambda name, rtype: None
+            try:
+                self.shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        self.__buffer = self.shm.buf
+        magic, self.capacity, published = RingFormat.STRUCT_HEADER.unpack_from(self.__buffer, 0)
+        if magic != RingFormat.MAGIC:
+            raise ValueError("Shared memory {} is not a telemetry ring".format(name))
+        self.next_number = max(published - self.capacity, 0) if from_start else published
+        self.lost = 0
+
+    @property
+    def published(self):
+        return RingFormat.STRUCT_SEQUENCE.unpack_from(self.__buffer, RingFormat.OFFSET_PUBLISHED)[0]
+
+    def get(self, number):
+        """
+        Reads one sample by number.
+
+        :param number: sample number
+        :return: StatusSample, or None if it was overwritten or not written yet
+        """
+        offset = RingFormat.slot_offset(self.capacity, number)
+        values = RingFormat.STRUCT_SLOT.unpack_from(self.__buffer, offset)
+        if values[0] != number + 1:
+            return None
+        # Slot must not have been rewritten while it was unpacked.
+        if RingFormat.STRUCT_SEQUENCE.unpack_from(self.__buffer, offset)[0] != number + 1:
+            return None
+        (_, timestamp, voltage, current, power, max_current, max_power, resistance, address, state) = values
+        return StatusSample(timestamp, address, current, voltage, power, max_current, max_power, resistance, state)
+
+    def slot_view(self, number):
+        """
+        Raw view of a slot in shared memory, without copying.
+        Check still_valid(number) after using it.
+
+        :return: memoryview of RingFormat.STRUCT_SLOT bytes
+        """
+        offset = RingFormat.slot_offset(self.capacity, number)
+        return self.__buffer[offset:offset + RingFormat.SLOT_SIZE]
+
+    def still_valid(self, number):
+        offset = RingFormat.slot_offset(self.capacity, number)
+        return RingFormat.STRUCT_SEQUENCE.unpack_from(self.__buffer, offset)[0] == number + 1
+
+    def read(self, max_samples=None):
+        """
+        Reads samples published since last read.
+        Samples overwritten before they were read are counted in lost.
+
+        :param max_samples: Maximum number of samples to return
+        :return: list of StatusSample
+        """
+        published = self.published
+        oldest = max(published - self.capacity, 0)
+        if self.next_number < oldest:
+            self.lost += oldest - self.next_number
+            self.next_number = oldest
+        end = published
+        if max_samples is not None:
+            end = min(end, self.next_number + max_samples)
+        samples = []
+        for number in range(self.next_number, end):
+            sample = self.get(number)
+            if sample is None:
+                self.lost += 1
+            else:
+                samples.append(sample)
+        self.next_number = end
+        return samples
+
+    def close(self):
+        self.__buffer = None
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RingPublisher(object):
+    """
+    Polls loads at a fixed interval and publishes their samples to a ring.
+    """
+
+    def __init__(self, ring, loads, interval=0.1, retry_count=0):
+        """
+        :param ring: TelemetryRing
+        :param loads: Loads to poll
+        :param interval: Time between poll cycles in seconds
+        :param retry_count: retry_count passed to update_status
+        :return: None
+        """
+        self.ring = ring
+        self.loads = list(loads)
+        self.interval = interval
+        self.retry_count = retry_count
+        self.poll_errors = 0
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def poll_once(self):
+        for load in self.loads:
+            try:
+                status = load.update_status(retry_count=self.retry_count)
+            except IOError:
+                self.poll_errors += 1
+            else:
+                self.ring.publish(sample_from_status(load.address, status))
+
+    def __run(self):
+        next_cycle = monotonic()
+        while not self.__stop.is_set():
+            self.poll_once()
+            next_cycle = max(next_cycle + self.interval, monotonic())
+            self.__stop.wait(next_cycle - monotonic())
+
+    def start(self):
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
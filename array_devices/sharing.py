@@ -0,0 +1,349 @@
+"""
+Sharing of serial buses between local processes.
+
+BusServer owns one or more serial connections and executes frames sent by
+any number of local clients over a TCP or Unix socket.  Clients use
+RemoteSerial in place of a serial connection, or RemoteLoad in place of Load.
+
+Run as a daemon with:
+  python -m array_devices.sharing --port COM4 --baud 9600 --listen 127.0.0.1:5710
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import socket
+import struct
+import threading
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from .array3710 import Load, byte2int
+
+__author__ = 'Joe Sacher'
+
+# Client request: bus id, sequence number, response expected flag, frame
+STRUCT_REQUEST = struct.Struct(b'< 2H B 26s')
+# Server reply: sequence number of request, bytes written, bytes read, read data (padded)
+STRUCT_REPLY = struct.Struct(b'< H 2B 26s')
+
+
+def recv_exact(sock, length):
+    """
+    Receives exactly length bytes from socket.
+
+    :param sock: connected socket
+    :param length: number of bytes
+    :return: byte string, or empty string if connection closed first
+    """
+    data = b''
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            return b''
+        data += chunk
+    return data
+
+
+class _PendingStatus(object):
+    """
+    Result of a status request shared by all clients that asked for it
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = (0, b'')
+
+
+class SharedBus(object):
+    """
+    Serializes transactions on one serial connection.
+
+    Identical status (0x91) requests waiting for the bus are merged, so
+    one frame on the wire answers every waiting client.
+    """
+
+    def __init__(self, serial_connection):
+        self.serial = serial_connection
+        self.__bus_lock = threading.Lock()
+        self.__pending_lock = threading.Lock()
+        self.__pending = {}
+        self.transaction_count = 0
+        self.merged_count = 0
+
+    def __transact(self, frame, expect_response):
+        """
+        Writes frame and reads response if expected.  Bus lock must be held.
+
+        :return: (bytes_written, read_string)
+        """
+        bytes_written = self.serial.write(frame)
+        read_string = b''
+        if expect_response:
+            read_string = self.serial.read(Load.FRAME_LENGTH)
+        self.transaction_count += 1
+        return bytes_written, read_string
+
+    def execute(self, frame, expect_response):
+        """
+        Executes a frame on the bus for a client.
+
+        :param frame: 26 byte frame
+        :param expect_response: True if a response frame should be read
+        :return: (bytes_written, read_string)
+        """
+        if not (expect_response and byte2int(frame[2]) == Load.CMD_READ_VALUES):
+            with self.__bus_lock:
+                return self.__transact(frame, expect_response)
+
+        with self.__pending_lock:
+            pending = self.__pending.get(frame)
+            owner = pending is None
+            if owner:
+                pending = _PendingStatus()
+                self.__pending[frame] = pending
+            else:
+                self.merged_count += 1
+        if not owner:
+            pending.event.wait()
+            return pending.result
+        try:
+            with self.__bus_lock:
+                # Requests arriving after this point get a fresh poll.
+                with self.__pending_lock:
+                    del self.__pending[frame]
+                pending.result = self.__transact(frame, expect_response)
+        finally:
+            pending.event.set()
+        return pending.result
+
+
+class _BusRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Executes requests from one client connection until it closes
+    """
+
+    def handle(self):
+        while True:
+            request = recv_exact(self.request, STRUCT_REQUEST.size)
+            if not request:
+                return
+            bus_id, sequence, expect_response, frame = STRUCT_REQUEST.unpack(request)
+            bus = self.server.buses.get(bus_id)
+            if bus is None:
+                # Unknown bus is answered like a dead bus: nothing written or read.
+                bytes_written, read_string = 0, b''
+            else:
+                try:
+                    bytes_written, read_string = bus.execute(frame, expect_response)
+                except (IOError, OSError) as err:
+                    print("Bus {} IOError: {}".format(bus_id, err))
+                    bytes_written, read_string = 0, b''
+            self.request.sendall(STRUCT_REPLY.pack(sequence, bytes_written or 0, len(read_string), read_string))
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class BusServer(object):
+    """
+    Multiplexes client frames onto owned serial connections.
+    """
+
+    def __init__(self, buses, address=('127.0.0.1', 5710)):
+        """
+        :param buses: dict of bus id -> serial connection, or a single serial connection as bus 0
+        :param address: (host, port) for TCP, or path string for Unix socket
+        :return: None
+        """
+        if not isinstance(buses, dict):
+            buses = {0: buses}
+        self.buses = dict((bus_id, SharedBus(conn)) for bus_id, conn in buses.items())
+        if isinstance(address, tuple):
+            self.server = _ThreadingTCPServer(address, _BusRequestHandler)
+        elif hasattr(socketserver, 'UnixStreamServer'):
+            self.server = _ThreadingUnixServer(address, _BusRequestHandler)
+        else:
+            raise ValueError("Unix sockets not supported on this platform, use (host, port)")
+        self.server.buses = self.buses
+        self.address = self.server.server_address
+        self.__thread = None
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def start(self):
+        """
+        Starts serving in a background thread
+        """
+        self.__thread = threading.Thread(target=self.server.serve_forever)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def close(self):
+        if self.__thread is not None:
+            self.server.shutdown()
+            self.__thread.join()
+            self.__thread = None
+        self.server.server_close()
+        if not isinstance(self.address, tuple) and os.path.exists(self.address):
+            os.remove(self.address)
+
+
+class RemoteSerial(object):
+    """
+    Serial compatible client of a BusServer.
+
+    Each write is executed by the server and its response buffered for
+    the following read.  Can be passed to Load in place of the serial connection.
+
+    Requests carry a sequence number echoed in the reply, so a reply that
+    arrives after its request timed out is discarded instead of being taken
+    as the answer to the next request.
+    """
+
+    def __init__(self, address=('127.0.0.1', 5710), bus_id=0, timeout=None):
+        """
+        :param address: (host, port) for TCP, or path string for Unix socket
+        :param bus_id: Bus on server to use
+        :param timeout: Socket timeout in seconds
+        :return: None
+        """
+        if isinstance(address, tuple):
+            self.socket = socket.create_connection(address, timeout)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.settimeout(timeout)
+            self.socket.connect(address)
+        self.bus_id = bus_id
+        self.__lock = threading.Lock()
+        self.__read_buffer = b''
+        # Bytes of a reply received before a timeout, completed by the next receive
+        self.__reply_buffer = b''
+        self.__sequence = 0
+        self.stale_replies = 0
+
+    def write(self, data_str):
+        """
+        Sends frame to server and waits for it to be executed.
+
+        :param data_str: 26 byte frame
+        :return: number of bytes written to the bus
+        """
+        data_str = bytes(data_str)
+        expect_response = byte2int(data_str[2]) == Load.CMD_READ_VALUES
+        with self.__lock:
+            self.__read_buffer = b''
+            self.__sequence = (self.__sequence + 1) % 0x10000
+            self.socket.sendall(STRUCT_REQUEST.pack(self.bus_id, self.__sequence, expect_response, data_str))
+            while True:
+                sequence, bytes_written, length, read_string = STRUCT_REPLY.unpack(self.__receive_reply())
+                if sequence == self.__sequence:
+                    break
+                # Late reply to a request that timed out
+                self.stale_replies += 1
+            self.__read_buffer = read_string[:length]
+        return bytes_written
+
+    def __receive_reply(self):
+        """
+        Receives one reply.  On socket timeout, bytes received so far are kept
+        for the next call, so the stream stays aligned on replies.
+        """
+        while len(self.__reply_buffer) < STRUCT_REPLY.size:
+            try:
+                chunk = self.socket.recv(STRUCT_REPLY.size - len(self.__reply_buffer))
+            except socket.timeout:
+                raise IOError("Timeout waiting for bus server reply")
+            if not chunk:
+                raise IOError("Connection to bus server closed")
+            self.__reply_buffer += chunk
+        reply, self.__reply_buffer = self.__reply_buffer, b''
+        return reply
+
+    def read(self, length=1):
+        """
+        Returns response buffered by last write.
+
+        :param length: length to read
+        :return: byte_string
+        """
+        with self.__lock:
+            response = self.__read_buffer[:length]
+            self.__read_buffer = self.__read_buffer[length:]
+        return response
+
+    def close(self):
+        self.socket.close()
+
+
+class RemoteLoad(Load):
+    """
+    Load controlled through a BusServer instead of a local serial connection.
+    """
+
+    def __init__(self, address, server_address=('127.0.0.1', 5710), bus_id=0, print_errors=True, lazy=False):
+        """
+        :param address: Load address (0x00-0xFE)
+        :param server_address: (host, port) or Unix socket path of BusServer
+        :param bus_id: Bus on server the load is connected to
+        :return: None
+        """
+        super(RemoteLoad, self).__init__(address, RemoteSerial(server_address, bus_id), print_errors, lazy)
+
+    def close(self):
+        self.serial.close()
+
+
+def main():
+    import argparse
+    import time
+
+    try:
+        import serial
+    except ImportError as err:
+        import sys
+        sys.exit("ImportError: {}.\nIs pySerial package installed?".format(err))
+
+    parser = argparse.ArgumentParser(description="Share serial buses of Array loads between processes.")
+    parser.add_argument('--port', action='append', required=True,
+                        help="Serial port.  Repeat for more buses, numbered from 0 in order given.")
+    parser.add_argument('--baud', type=int, default=9600)
+    parser.add_argument('--timeout', type=float, default=1)
+    parser.add_argument('--listen', default='127.0.0.1:5710',
+                        help="host:port for TCP, or path for Unix socket")
+    args = parser.parse_args()
+
+    buses = dict((ind, serial.Serial(port, args.baud, timeout=args.timeout))
+                 for ind, port in enumerate(args.port))
+    address = args.listen
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        address = (host, int(port))
+    server = BusServer(buses, address)
+    print("Serving {} on {}".format(", ".join(args.port), address))
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        for conn in buses.values():
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+"""
+Soak testing of loads, adapters and cabling.
+
+SoakRunner drives a weighted mix of set parameters (0x90), read values (0x91)
+and load state (0x92) commands against loads for a time or command budget,
+recording every outcome, and SoakLog reports throughput, error rate over
+time and whether failures come in bursts.
+
+Run from the command line with:
+  python -m array_devices.soak --port COM4 --address 0 --address 1 --duration 3600
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import array
+import collections
+import random
+import threading
+import time
+
+from .array3710 import Load, monotonic
+from .rack import connect, group_by_bus
+
+__author__ = 'Joe Sacher'
+
+DEFAULT_MIX = {Load.CMD_SET_PARAMETERS: 1, Load.CMD_READ_VALUES: 8, Load.CMD_LOAD_STATE: 1}
+
+Burst = collections.namedtuple('Burst', 'start_time end_time length')
+
+
+class SoakLog(object):
+    """
+    Compact record of command outcomes, one entry per command
+    in parallel arrays.
+
+    Buses are soaked in parallel threads, so entries are in time order
+    per bus only.  Bursts and clustering are found per bus.
+    """
+
+    def __init__(self):
+        self.times = array.array(str('d'))
+        self.durations = array.array(str('f'))
+        self.commands = array.array(str('B'))
+        self.addresses = array.array(str('B'))
+        self.failures = array.array(str('B'))
+        self.buses = array.array(str('B'))
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, timestamp, duration, command, address, failed, bus=0):
+        with self.__lock:
+            self.times.append(timestamp)
+            self.durations.append(duration)
+            self.commands.append(command)
+            self.addresses.append(address)
+            self.failures.append(1 if failed else 0)
+            self.buses.append(bus)
+
+    @property
+    def elapsed(self):
+        if not self.times:
+            return 0.0
+        return max(timestamp + duration for timestamp, duration in zip(self.times, self.durations)) - min(self.times)
+
+    def __sequences(self, address=None):
+        """
+        Entry indexes of each bus in time order.
+
+        :param address: Only entries of this load address, if given
+        :return: list of index lists
+        """
+        sequences = collections.OrderedDict()
+        for ind in range(len(self)):
+            if address is None or self.addresses[ind] == address:
+                sequences.setdefault(self.buses[ind], []).append(ind)
+        return [sorted(indexes, key=lambda ind: self.times[ind]) for indexes in sequences.values()]
+
+    @property
+    def failure_count(self):
+        return sum(self.failures)
+
+    def commands_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return len(self) / self.elapsed
+
+    def error_rate(self):
+        if not self.times:
+            return 0.0
+        return self.failure_count / len(self)
+
+    def error_rate_over_time(self, bucket=60.0):
+        """
+        Command and failure counts in fixed time buckets.
+
+        :param bucket: Bucket length in seconds
+        :return: list of (bucket start offset in seconds, commands, failures)
+        """
+        if not self.times:
+            return []
+        start = min(self.times)
+        count = int((max(self.times) - start) // bucket) + 1
+        commands = [0] * count
+        failures = [0] * count
+        for timestamp, failed in zip(self.times, self.failures):
+            ind = int((timestamp - start) // bucket)
+            commands[ind] += 1
+            failures[ind] += failed
+        return [(ind * bucket, commands[ind], failures[ind]) for ind in range(count)]
+
+    def bursts(self, address=None):
+        """
+        Runs of consecutive failed commands on a bus.
+
+        :param address: Only consider commands to this load, if given.
+                        Failures on a shared bus are usually examined together.
+        :return: list of Burst, by start time
+        """
+        bursts = []
+        for indexes in self.__sequences(address):
+            run_start = None
+            length = 0
+            last_time = None
+            for ind in indexes:
+                if self.failures[ind]:
+                    if run_start is None:
+                        run_start = self.times[ind]
+                    length += 1
+                    last_time = self.times[ind] + self.durations[ind]
+                elif run_start is not None:
+                    bursts.append(Burst(run_start, last_time, length))
+                    run_start = None
+                    length = 0
+            if run_start is not None:
+                bursts.append(Burst(run_start, last_time, length))
+        return sorted(bursts, key=lambda burst: burst.start_time)
+
+    def clustering(self, bucket=60.0):
+        """
+        Statistics showing whether failures are random or come in bursts.
+
+        failure_after_failure is the chance a command fails when the one before
+        it on the same bus failed.  Compared to error_rate, a much higher value means failures
+        cluster, like a load that does not recover during a packet storm.
+        dispersion is variance / mean of failures per bucket, about 1 for
+        random failures and much larger for bursts.
+
+        :param bucket: Bucket length in seconds for dispersion
+        :return: dict of statistics
+        """
+        after_failure = 0
+        failure_after_failure = 0
+        for indexes in self.__sequences():
+            for previous, current in zip(indexes, indexes[1:]):
+                if self.failures[previous]:
+                    after_failure += 1
+                    failure_after_failure += self.failures[current]
+        per_bucket = [failures for _, _, failures in self.error_rate_over_time(bucket)]
+        dispersion = None
+        if per_bucket and sum(per_bucket):
+            mean = sum(per_bucket) / len(per_bucket)
+            variance = sum((count - mean) ** 2 for count in per_bucket) / len(per_bucket)
+            dispersion = variance / mean
+        bursts = self.bursts()
+        return {'error_rate': self.error_rate(),
+                'failure_after_failure': failure_after_failure / after_failure if after_failure else None,
+                'dispersion': dispersion,
+                'bursts': len(bursts),
+                'longest_burst': max([burst.length for burst in bursts] or [0])}
+
+    def report(self, bucket=60.0):
+        """
+        Text summary of soak results
+        """
+        lines = ["Commands: {} in {:.1f}s, {:.1f} commands/s".format(
+                     len(self), self.elapsed, self.commands_per_second()),
+                 "Failures: {} ({:.4%})".format(self.failure_count, self.error_rate())]
+        stats = self.clustering(bucket)
+        lines.append("Bursts: {} longest {} commands".format(stats['bursts'], stats['longest_burst']))
+        if stats['failure_after_failure'] is not None:
+            lines.append("Failure after failure: {:.2%}".format(stats['failure_after_failure']))
+        if stats['dispersion'] is not None:
+            lines.append("Dispersion per {}s: {:.2f}".format(bucket, stats['dispersion']))
+        for offset, commands, failures in self.error_rate_over_time(bucket):
+            if failures:
+                lines.append("  {:8.0f}s {:6d} commands {:6d} failures".format(offset, commands, failures))
+        return "\n".join(lines)
+
+
+class SoakRunner(object):
+    """
+    Drives a random command mix against loads.
+
+    Loads on different buses run in parallel, one thread per bus.
+    0x90 commands apply the setpoint given, by default 500 ohms, the
+    lightest setting, and alternate max power between its value at start
+    and 0.1 W below, so each 0x90 changes what status shows.  Max power is
+    restored at the end.  0x92 commands resend the current load state.
+    Every logged command is a single frame.  With read_back, each 0x90 and
+    0x92 command is followed by a 0x91 logged on its own, and the command
+    fails if the status shows settings other than the ones sent.  A 0x92
+    doesn't change state, so its read back only catches a load that
+    changed state by itself.
+    """
+
+    def __init__(self, loads, mix=None, set_type=Load.SET_TYPE_RESISTANCE, setting=500, seed=None,
+                 frame_gap=0.0, read_back=True):
+        """
+        :param loads: Loads to soak
+        :param mix: dict of command code -> weight.  Defaults to DEFAULT_MIX.
+        :param set_type: Load.SET_TYPE_? mode for 0x90 commands
+        :param setting: Amps, Watts or Ohms for 0x90 commands
+        :param seed: Random seed, for a repeatable command sequence
+        :param frame_gap: Pause after each command in seconds
+        :param read_back: True to read status after 0x90 and 0x92 commands
+        :return: None
+        """
+        self.loads = list(loads)
+        mix = mix or DEFAULT_MIX
+        for command in mix:
+            if command not in DEFAULT_MIX:
+                raise ValueError("Soak commands must be 0x90, 0x91 or 0x92")
+        self.commands = sorted(mix)
+        self.weights = [mix[command] for command in self.commands]
+        self.set_type = set_type
+        self.setting = setting
+        self.seed = seed
+        self.frame_gap = frame_gap
+        self.read_back = read_back
+        self.log = SoakLog()
+        self.__set_value = Load.to_load_units(Load.SET_TYPE_NAMES[set_type], setting)
+        # id of load -> max power at start, in load units
+        self.__max_powers = {}
+
+    def send(self, load, command):
+        """
+        Sends one command frame
+
+        :return: True if command succeeded
+        """
+        try:
+            if command == Load.CMD_SET_PARAMETERS:
+                load.send_frame(load.set_parameters_frame(self.set_type, self.__set_value,
+                                                          max_power=self.__next_max_power(load)))
+            elif command == Load.CMD_READ_VALUES:
+                load.update_status(retry_count=0)
+            else:
+                load.set_load_state(load.remote_control, load.load_on)
+        except IOError:
+            return False
+        return True
+
+    @staticmethod
+    def check(load, command):
+        """
+        Reads status with a single 0x91 frame, after a 0x90 or 0x92 command.
+        Status has no load mode or setpoint, so a 0x90 is checked by its
+        max current and max power.
+
+        :return: (True if 0x91 succeeded, True if status shows the settings sent,
+                  None if unknown)
+        """
+        if command == Load.CMD_SET_PARAMETERS:
+            expected = (load.max_current, load.max_power)
+        else:
+            expected = (load.remote_control, load.load_on)
+        try:
+            status = load.update_status(retry_count=0)
+        except IOError:
+            return False, None
+        if command == Load.CMD_SET_PARAMETERS:
+            actual = (status.max_current / 1000, status.max_power / 10)
+        else:
+            actual = (status.remote_control, status.load_on)
+        return True, actual == expected
+
+    def __next_max_power(self, load):
+        """
+        Max power for next 0x90, differing from the last one sent or read
+        """
+        initial = self.__max_powers.setdefault(id(load), int(round(load.max_power * 10)))
+        alternate = initial - 1 if initial else initial + 1
+        if int(round(load.max_power * 10)) == initial:
+            return alternate
+        return initial
+
+    def __restore_max_power(self, load):
+        initial = self.__max_powers.get(id(load))
+        if initial is None or int(round(load.max_power * 10)) == initial:
+            return
+        try:
+            load.send_frame(load.set_parameters_frame(self.set_type, self.__set_value, max_power=initial))
+        except IOError:
+            pass
+
+    def __choose(self, rand):
+        pick = rand.uniform(0, sum(self.weights))
+        for command, weight in zip(self.commands, self.weights):
+            pick -= weight
+            if pick <= 0:
+                return command
+        return self.commands[-1]
+
+    def __run_bus(self, bus, loads, deadline, budget, seed):
+        rand = random.Random(seed)
+        sent = 0
+        while (deadline is None or monotonic() < deadline) and (budget is None or sent < budget):
+            load = loads[sent % len(loads)]
+            command = self.__choose(rand)
+            start = monotonic()
+            ok = self.send(load, command)
+            duration = monotonic() - start
+            sent += 1
+            if self.frame_gap:
+                time.sleep(self.frame_gap)
+            if not ok or not self.read_back or command == Load.CMD_READ_VALUES:
+                self.log.add(start, duration, command, load.address, not ok, bus)
+                continue
+            read_start = monotonic()
+            read_ok, applied = self.check(load, command)
+            self.log.add(start, duration, command, load.address, applied is False, bus)
+            self.log.add(read_start, monotonic() - read_start, Load.CMD_READ_VALUES, load.address,
+                         not read_ok, bus)
+            if self.frame_gap:
+                time.sleep(self.frame_gap)
+        for load in loads:
+            self.__restore_max_power(load)
+
+    def run(self, duration=None, max_commands=None):
+        """
+        Runs the soak until duration or command budget is used.
+
+        :param duration: Seconds to run
+        :param max_commands: Commands to send per bus
+        :return: SoakLog
+        """
+        if duration is None and max_commands is None:
+            raise ValueError("A duration or command budget is required")
+        # Current load state is needed before 0x92 commands resend it.
+        result = connect(self.loads)
+        if result.unreachable:
+            raise IOError("Loads not responding: {}".format(
+                ", ".join(str(load.address) for load in result.unreachable)))
+        self.__max_powers = dict((id(load), load.status.max_power) for load in self.loads)
+        deadline = None
+        if duration is not None:
+            deadline = monotonic() + duration
+        threads = []
+        for ind, loads in enumerate(group_by_bus(self.loads)):
+            seed = None if self.seed is None else self.seed + ind
+            thread = threading.Thread(target=self.__run_bus, args=(ind, loads, deadline, max_commands, seed))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return self.log
+
+
+def main():
+    import argparse
+
+    try:
+        import serial
+    except ImportError as err:
+        import sys
+        sys.exit("ImportError: {}.\nIs pySerial package installed?".format(err))
+
+    parser = argparse.ArgumentParser(description="Soak test Array loads.")
+    parser.add_argument('--port', action='append', required=True, help="Serial port, may be repeated")
+    parser.add_argument('--address', action='append', type=int, required=True,
+                        help="Load address on every port, may be repeated")
+    parser.add_argument('--baud', type=int, default=9600)
+    parser.add_argument('--duration', type=float, help="Seconds to run")
+    parser.add_argument('--commands', type=int, help="Commands to send per port")
+    parser.add_argument('--mix', default='1,8,1', help="Weights of 0x90,0x91,0x92 commands")
+    parser.add_argument('--resistance', type=float, default=500, help="Resistance resent by 0x90 commands")
+    parser.add_argument('--gap', type=float, default=0.0, help="Pause after each command in seconds")
+    parser.add_argument('--no-read-back', action='store_true',
+                        help="Don't read status after 0x90 and 0x92 commands")
+    parser.add_argument('--bucket', type=float, default=60.0, help="Report bucket in seconds")
+    args = parser.parse_args()
+
+    weights = [float(weight) for weight in args.mix.split(',')]
+    mix = dict(zip((Load.CMD_SET_PARAMETERS, Load.CMD_READ_VALUES, Load.CMD_LOAD_STATE), weights))
+    connections = [serial.Serial(port, args.baud, timeout=1) for port in args.port]
+    loads = [Load(address, conn, print_errors=False, lazy=True)
+             for conn in connections for address in args.address]
+    runner = SoakRunner(loads, mix, Load.SET_TYPE_RESISTANCE, args.resistance, frame_gap=args.gap,
+                        read_back=not args.no_read_back)
+    try:
+        runner.run(args.duration, args.commands)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for conn in connections:
+            conn.close()
+    print(runner.log.report(args.bucket))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Status samples for telemetry streams.
+
+A StatusSample holds the values of one read values (0x91) response in load
+units (mA, mV, 0.1 W, 0.01 ohms), with the output state flags packed in one
+int as sent by the load, and a monotonic timestamp.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+
+from .array3710 import monotonic
+
+__author__ = 'Joe Sacher'
+
+SAMPLE_FIELDS = ('timestamp', 'address', 'current', 'voltage', 'power',
+                 'max_current', 'max_power', 'resistance', 'state')
+
+# Raw values that are measurements, as opposed to settings and flags
+MEASUREMENT_FIELDS = ('current', 'voltage', 'power', 'resistance')
+
+# Output state bits, as in StatusSnapshot.state
+STATE_REMOTE_CONTROL = 0b00000001
+STATE_LOAD_ON = 0b00000010
+STATE_WRONG_POLARITY = 0b00000100
+STATE_EXCESSIVE_TEMP = 0b00001000
+STATE_EXCESSIVE_VOLTAGE = 0b00010000
+STATE_EXCESSIVE_POWER = 0b00100000
+
+StatusSample = collections.namedtuple('StatusSample', SAMPLE_FIELDS)
+
+
+def sample_from_load(load, timestamp=None):
+    """
+    Sample of values from last update_status call of a load.
+
+    :param load: Load object
+    :param timestamp: monotonic time of sample, defaults to time of last update_status
+    :return: StatusSample
+    """
+    return sample_from_status(load.address, load.status, timestamp)
+
+
+def sample_from_status(address, status, timestamp=None):
+    """
+    Sample of values of a StatusSnapshot.
+
+    :param address: Load address
+    :param status: StatusSnapshot, ex: returned by Load.update_status
+    :param timestamp: monotonic time of sample, defaults to time of snapshot
+    :return: StatusSample
+    """
+    if timestamp is None:
+        timestamp = status.timestamp
+        if timestamp is None:
+            timestamp = monotonic()
+    return StatusSample(timestamp, address, status.current, status.voltage, status.power,
+                        status.max_current, status.max_power, status.resistance, status.state)
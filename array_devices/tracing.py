@@ -0,0 +1,165 @@
+"""
+Span tracing of bus operations.
+
+Set a Tracer on loads (or on Load for every load) and each operation is
+recorded as nested spans: encode, write, wait for response, decode, retries,
+plus pacing sleeps of PacedSerial and bus recoveries.  Spans are kept in
+memory and exported as Chrome trace event JSON, with a process per bus and a
+thread per load address, so the timeline opens in chrome://tracing or
+Perfetto:
+
+    tracer = tracing.Tracer()
+    Load.tracer = tracer
+    ...
+    tracer.export_chrome('rig.json')
+
+With no tracer set, each traced point only checks for a tracer and enters
+a shared no-op span.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import json
+import threading
+
+from .array3710 import NO_SPAN, monotonic
+
+__author__ = 'Joe Sacher'
+
+TraceEvent = collections.namedtuple('TraceEvent', 'name start end bus address args')
+
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'bus', 'address', 'args', 'start')
+
+    def __init__(self, tracer, name, bus, address, args):
+        self.tracer = tracer
+        self.name = name
+        self.bus = bus
+        self.address = address
+        self.args = args
+
+    def __enter__(self):
+        self.start = monotonic()
+        return self
+
+    def set(self, **args):
+        """
+        Adds values shown with span, ex: counts only known at the end
+        """
+        self.args = dict(self.args or {}, **args)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_value is not None:
+            self.args = dict(self.args or {}, error=str(exc_value))
+        self.tracer.add(self.name, self.start, monotonic(), self.bus, self.address, self.args)
+        return False
+
+
+def span(tracer, name, bus=None, address=None, **args):
+    """
+    Span context manager of tracer, or a no-op span if tracer is None.
+
+    :param tracer: Tracer or None
+    :param name: Span name, ex: 'write'
+    :param bus: Serial connection the span belongs to
+    :param address: Load address, None for bus level spans
+    :param args: Extra values shown with span
+    """
+    if tracer is None:
+        return NO_SPAN
+    return tracer.span(name, bus, address, **args)
+
+
+class Tracer(object):
+    """
+    In-memory buffer of spans.
+    """
+
+    def __init__(self, max_events=1000000):
+        """
+        :param max_events: Spans kept.  Oldest spans are dropped once full.
+        :return: None
+        """
+        self.origin = monotonic()
+        self.events = collections.deque(maxlen=max_events)
+        # id of serial connection -> bus number, bus number -> name
+        self.__buses = {}
+        self.__bus_names = {}
+        self.__lock = threading.Lock()
+
+    def span(self, name, bus=None, address=None, **args):
+        return _Span(self, name, bus, address, args or None)
+
+    def add(self, name, start, end, bus=None, address=None, args=None):
+        """
+        Records a finished span.
+
+        :param name: Span name
+        :param start: monotonic start time
+        :param end: monotonic end time
+        :param bus: Serial connection the span belongs to
+        :param address: Load address, None for bus level spans
+        :param args: dict of extra values, or None
+        :return: None
+        """
+        self.events.append(TraceEvent(name, start, end, self.bus_id(bus), address, args))
+
+    def bus_id(self, bus):
+        """
+        Number of a bus in the trace, by serial connection
+        """
+        if bus is None:
+            return 0
+        key = id(bus)
+        bus_id = self.__buses.get(key)
+        if bus_id is None:
+            with self.__lock:
+                bus_id = self.__buses.get(key)
+                if bus_id is None:
+                    bus_id = len(self.__buses) + 1
+                    port = getattr(bus, 'port', None)
+                    self.__buses[key] = bus_id
+                    self.__bus_names[bus_id] = port if port else "bus {}".format(bus_id)
+        return bus_id
+
+    def clear(self):
+        self.events.clear()
+
+    def to_chrome(self):
+        """
+        Trace as Chrome trace event format dict.
+        Buses are processes and load addresses are threads.
+        """
+        trace_events = []
+        threads = set()
+        for event in list(self.events):
+            tid = -1 if event.address is None else event.address
+            threads.add((event.bus, tid))
+            trace_event = {'name': event.name,
+                           'cat': 'bus' if event.address is None else 'load',
+                           'ph': 'X',
+                           'ts': (event.start - self.origin) * 1e6,
+                           'dur': (event.end - event.start) * 1e6,
+                           'pid': event.bus,
+                           'tid': tid}
+            if event.args:
+                trace_event['args'] = event.args
+            trace_events.append(trace_event)
+        names = dict(self.__bus_names)
+        for bus_id in sorted(set(bus for bus, _ in threads)):
+            trace_events.append({'name': 'process_name', 'ph': 'M', 'pid': bus_id, 'tid': 0,
+                                 'args': {'name': names.get(bus_id, 'no bus')}})
+        for bus_id, tid in sorted(threads):
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': bus_id, 'tid': tid,
+                                 'args': {'name': 'bus' if tid < 0 else 'address {}'.format(tid)}})
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome(self, path):
+        """
+        Writes trace as Chrome trace event JSON file
+        """
+        with open(path, 'w') as trace_file:
+            json.dump(self.to_chrome(), trace_file)
@@ -0,0 +1,188 @@
+"""
+Protection watchdog for loads.
+
+ProtectionWatchdog polls every load at a fixed interval and turns a load
+off (and stops its program) as soon as a fault flag or a user limit trips.
+"""
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import threading
+
+from .array3710 import monotonic
+
+__author__ = 'Joe Sacher'
+
+# Fault flags decoded by Load.update_status
+FAULT_FLAGS = ('wrong_polarity', 'excessive_temp', 'excessive_voltage', 'excessive_power')
+
+Trip = collections.namedtuple('Trip', 'load reason detected latency')
+
+
+class ProtectionWatchdog(object):
+    """
+    Polls loads and switches them off on faults or limit violations.
+
+    One thread is used per serial connection, so loads on different buses
+    are polled in parallel.  Each thread starts a poll cycle every interval
+    seconds; cycles that take longer are counted in overruns.
+
+    Loads on a serial connection share a transaction lock (see
+    array3710.transaction_lock), so the script can use the same Load
+    objects while the watchdog runs.
+    """
+
+    def __init__(self, loads=(), interval=0.1, deadline=0.05, limits=None, on_trip=None):
+        """
+        :param loads: Loads to protect
+        :param interval: Time between poll cycles of a bus in seconds
+        :param deadline: Allowed time from detection to load off in seconds
+        :param limits: dict of Load property name -> (low, high) applied to all loads.
+                       Use None for no low or high limit.  Ex: {'voltage': (None, 30)}
+        :param on_trip: Called with Trip after a load is switched off
+        :return: None
+        """
+        self.interval = interval
+        self.deadline = deadline
+        self.on_trip = on_trip
+        self.trips = []
+        self.poll_errors = 0
+        self.overruns = 0
+        self.deadline_misses = 0
+        self.max_latency = 0.0
+        self.__limits = {}
+        self.__default_limits = dict(limits or {})
+        self.__tripped = set()
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__threads = []
+        self.__buses = collections.OrderedDict()
+        for load in loads:
+            self.add_load(load)
+
+    def add_load(self, load, limits=None):
+        """
+        Adds a load to protect.  Must be called before start().
+
+        :param load: Load object
+        :param limits: limits for this load, replacing the watchdog limits
+        :return: None
+        """
+        if limits is None:
+            limits = self.__default_limits
+        self.__limits[id(load)] = dict(limits)
+        self.__buses.setdefault(id(load.serial), []).append(load)
+
+    def check(self, load):
+        """
+        Reason load should be tripped, from its last update_status values.
+
+        :param load: Load object
+        :return: reason string, or None if load is ok
+        """
+        for flag in FAULT_FLAGS:
+            if getattr(load, flag):
+                return flag
+        for name, (low, high) in self.__limits[id(load)].items():
+            value = getattr(load, name)
+            if low is not None and value < low:
+                return "{} {} below {}".format(name, value, low)
+            if high is not None and value > high:
+                return "{} {} above {}".format(name, value, high)
+        return None
+
+    def trip(self, load, reason, detected):
+        """
+        Turns load off and stops its program.
+
+        :param load: Load object
+        :param reason: Description of trip cause
+        :param detected: monotonic time the trip was detected
+        :return: Trip
+        """
+        # Load off first, it is the one that removes power.
+        # Always sent, cached load_on may be stale.
+        load.set_load_state(load.remote_control, False)
+        latency = monotonic() - detected
+        load.stop_program(turn_off_load=False)
+        trip = Trip(load, reason, detected, latency)
+        with self.__lock:
+            self.__tripped.add(id(load))
+            self.trips.append(trip)
+            self.max_latency = max(self.max_latency, latency)
+            if latency > self.deadline:
+                self.deadline_misses += 1
+        if self.on_trip is not None:
+            self.on_trip(trip)
+        return trip
+
+    def is_tripped(self, load):
+        return id(load) in self.__tripped
+
+    def reset(self, load):
+        """
+        Clears a trip, so load is protected again.  Does not turn load on.
+        """
+        with self.__lock:
+            self.__tripped.discard(id(load))
+
+    def poll(self, load):
+        """
+        Polls one load and trips it if needed.
+
+        :return: Trip or None
+        """
+        try:
+            load.update_status(retry_count=0)
+        except IOError:
+            with self.__lock:
+                self.poll_errors += 1
+            return None
+        detected = monotonic()
+        if self.is_tripped(load):
+            return None
+        reason = self.check(load)
+        if reason is None:
+            return None
+        return self.trip(load, reason, detected)
+
+    def __run(self, loads):
+        next_cycle = monotonic()
+        while not self.__stop.is_set():
+            for load in loads:
+                self.poll(load)
+            next_cycle += self.interval
+            delay = next_cycle - monotonic()
+            if delay < 0:
+                with self.__lock:
+                    self.overruns += 1
+                # Start next cycle now, without trying to catch up missed cycles.
+                next_cycle = monotonic()
+            else:
+                self.__stop.wait(delay)
+
+    def start(self):
+        """
+        Starts polling threads, one per bus
+        """
+        self.__stop.clear()
+        for loads in self.__buses.values():
+            thread = threading.Thread(target=self.__run, args=(loads,))
+            thread.daemon = True
+            thread.start()
+            self.__threads.append(thread)
+
+    def stop(self):
+        self.__stop.set()
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -1,59 +1,61 @@
 from __future__ import division
-import serial
-import time
-from array_devices import array3710
+from __future__ import print_function
+import argparse
+
+try:
+    import serial
+except ImportError as err:
+    import sys
+    sys.exit("ImportError: {}.\nIs pySerial package installed?".format(err))
+
+from array_devices import baudrate
 
 __author__ = 'JoeSacher'
 
 """
-This is a crude script to play with PC baud rates while the load
-is set to a fixed baud rate.
-"""
+Walks PC baud rates and inter-frame gaps while the loads are set to a fixed
+baud rate, measuring error rate and status command throughput of each load.
+Ports are measured in parallel.  The best operating point of each port is
+stored in a cache file for baudrate.open_bus.
 
-load_addr = 1
+Example, two loads on COM4 set to 9600 baud:
+  python baud_test.py --port COM4 --address 0 --address 1 --min 3500 --max 20000 --step 100
+"""
 
-# This should match load
-base_baud_rate = 9600
-serial_conn = serial.Serial('COM4', base_baud_rate, timeout=1)
-load = array3710.Load(load_addr, serial_conn)
-load.remote_control = True
-serial_conn.close()
 
+def main():
+    parser = argparse.ArgumentParser(description="Characterize baud rates of Array loads.")
+    parser.add_argument('--port', action='append', required=True, help="Serial port, may be repeated")
+    parser.add_argument('--address', action='append', type=int, required=True,
+                        help="Load address, may be repeated")
+    parser.add_argument('--baud', action='append', type=int, help="Baud rate to test, may be repeated")
+    parser.add_argument('--min', type=int, default=3500, help="Start of baud rate range")
+    parser.add_argument('--max', type=int, default=20000, help="End of baud rate range")
+    parser.add_argument('--step', type=int, default=100, help="Step of baud rate range")
+    parser.add_argument('--gap', action='append', type=float, help="Frame gap in seconds, may be repeated")
+    parser.add_argument('--trials', type=int, default=10, help="Status requests per load and operating point")
+    parser.add_argument('--max-error-rate', type=float, default=0.0)
+    parser.add_argument('--cache', default='baudrate_cache.json', help="Cache file to update")
+    args = parser.parse_args()
 
-# Set this to sufficient range to get possible valid connections
-min_rate = 3500
-max_rate = 20000
-print("Walking from {} to {} for {}".format(min_rate, max_rate, base_baud_rate))
-for baud_rate in xrange(min_rate, max_rate, 100):
-    time.sleep(0.1)
-    serial_conn = serial.Serial('COM4', baud_rate, timeout=0.5)
-    try:
-        load = array3710.Load(load_addr, serial_conn, print_errors=False)
-    except IOError:
-        print("Baud_Rate: {} Error: Can't creating load".format(baud_rate))
-    else:
-        error_count = 0
-        for i in range(10):
-            try:
-                load.set_load_resistance(baud_rate/1000)
-                load.update_status(retry_count=1)
-    #            print(load.voltage)
-            except IOError:
-                error_count += 1
-            try:
-                load.load_on = True
+    baudrates = args.baud or list(range(args.min, args.max, args.step))
+    frame_gaps = args.gap or [0.0]
+    print("Walking {} baud rates from {} to {} on {}".format(len(baudrates), baudrates[0], baudrates[-1],
+                                                           ", ".join(args.port)))
+    results = baudrate.characterize(args.port, args.address, baudrates, frame_gaps, args.trials,
+                                    serial_factory=serial.Serial)
+    for port in args.port:
+        for measurement in results.get(port, []):
+            print("{} Address: {} Baud_Rate: {} Gap: {} - Errors: {}/{} - {:.1f} cmd/s".format(
+                port, measurement.address, measurement.baudrate, measurement.frame_gap,
+                measurement.errors, measurement.commands, baudrate.commands_per_second(measurement)))
+    cache = baudrate.update_cache(args.cache, results, args.max_error_rate)
+    for port in args.port:
+        print("{} best operating point: {}".format(port, baudrate.lookup(cache, port)))
 
-                load.load_on = False
-                time.sleep(0.05)
-            except IOError:
-                error_count += 1
-        print("Baud_Rate: {} - Errors: {}".format(baud_rate, error_count))
-    serial_conn.close()
 
-serial_conn = serial.Serial('COM4', base_baud_rate, timeout=1)
-load = array3710.Load(load_addr, serial_conn)
-load.remote_control = False
-serial_conn.close()
+if __name__ == '__main__':
+    main()
 
 """
 Results for both of my loads.
@@ -36,6 +36,8 @@ setup(
     packages = ['array_devices'],
     requires = [],
     extras_require = {
-        'serial': ['pyserial']
+        'serial': ['pyserial'],
+        'analysis': ['numpy'],
+        'parquet': ['pyarrow']
     }
 )
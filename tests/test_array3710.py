@@ -0,0 +1,75 @@
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import struct
+import threading
+import time
+import unittest
+
+from array_devices.array3710 import Load
+
+
+def status_response(address, current):
+    frame = bytearray(Load.FRAME_LENGTH)
+    struct.pack_into(b'< 3B H', frame, 0, 0xAA, address, Load.CMD_READ_VALUES, current)
+    frame[-1] = sum(frame[:-1]) % 256
+    return bytes(frame)
+
+
+class FakeBus(object):
+    """
+    Several loads on one connection, answering 0x91 with current of
+    1000 * address mA.  Reads take a moment, like a real bus, so frames
+    of unsynchronized threads interleave.
+    """
+
+    def __init__(self, reply_address=None):
+        self.reply_address = reply_address
+        self.__response = b''
+
+    def write(self, data_str):
+        data_str = bytearray(data_str)
+        if data_str[2] == Load.CMD_READ_VALUES:
+            address = data_str[1] if self.reply_address is None else self.reply_address
+            self.__response = status_response(address, 1000 * address)
+        return len(data_str)
+
+    def read(self, length=1):
+        time.sleep(0.0005)
+        response, self.__response = self.__response[:length], self.__response[length:]
+        return response
+
+
+class LoadThreadingTest(unittest.TestCase):
+
+    def test_loads_on_one_connection_get_own_status_from_threads(self):
+        bus = FakeBus()
+        loads = [Load(address, bus, print_errors=False, lazy=True) for address in (1, 2)]
+        wrong = []
+
+        def poll(load):
+            for _ in range(200):
+                try:
+                    status = load.update_status(retry_count=0)
+                except IOError:
+                    wrong.append(load.address)
+                    continue
+                if status.current != 1000 * load.address:
+                    wrong.append(load.address)
+
+        threads = [threading.Thread(target=poll, args=(load,)) for load in loads]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(wrong, [])
+
+    def test_response_from_other_address_is_rejected(self):
+        load = Load(1, FakeBus(reply_address=2), print_errors=False, lazy=True)
+        self.assertRaises(IOError, load.update_status, 0)
+        self.assertIsNone(load.status.timestamp)
+
+
+if __name__ == '__main__':
+    unittest.main()
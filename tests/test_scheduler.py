@@ -0,0 +1,129 @@
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import time
+import unittest
+
+from array_devices.array3710 import Load, monotonic
+from array_devices.scheduler import BusScheduler, PREEMPT_DEFER, PREEMPT_DROP, PRIORITY_TELEMETRY
+
+TIMEOUT = 0.3
+
+
+class SilentBus(object):
+    """
+    Loads that never answer, so every status read takes the full timeout.
+    Keeps (monotonic time, command, address) of each frame written.
+    """
+    baudrate = 9600
+    timeout = TIMEOUT
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data_str):
+        data_str = bytearray(data_str)
+        self.writes.append((monotonic(), data_str[2], data_str[1]))
+        return len(data_str)
+
+    def read(self, length=1):
+        time.sleep(self.timeout)
+        return b''
+
+    def commands(self):
+        return [(command, address) for _, command, address in self.writes]
+
+    def written_at(self, command, address):
+        for timestamp, written_command, written_address in self.writes:
+            if (written_command, written_address) == (command, address):
+                return timestamp
+        return None
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.005)
+
+
+class SafetyLatencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SilentBus()
+        self.scheduler = None
+        self.threads = []
+
+    def tearDown(self):
+        for thread in self.threads:
+            thread.join(10)
+        if self.scheduler is not None:
+            self.scheduler.close()
+
+    def start_polling(self, load, **kwargs):
+        thread = threading.Thread(target=self.poll, args=(load,), kwargs=kwargs)
+        thread.start()
+        self.threads.append(thread)
+
+    @staticmethod
+    def poll(load, retry_count=0):
+        try:
+            load.update_status(retry_count)
+        except IOError:
+            pass
+
+    def load_off_latency(self, load):
+        start = monotonic()
+        load.set_load_state(True, False)
+        return self.bus.written_at(Load.CMD_LOAD_STATE, load.address) - start
+
+    def test_safety_frame_overtakes_queued_polls(self):
+        self.scheduler = BusScheduler(self.bus, preempt=PREEMPT_DEFER)
+        loads = [Load(address, self.scheduler, print_errors=False, lazy=True) for address in range(4)]
+        self.start_polling(loads[1])
+        wait_for(lambda: len(self.bus.writes) == 1)
+        self.start_polling(loads[2])
+        self.start_polling(loads[3])
+        wait_for(lambda: self.scheduler.stats[PRIORITY_TELEMETRY].count == 1)
+        time.sleep(0.05)
+
+        latency = self.load_off_latency(loads[0])
+        for thread in self.threads:
+            thread.join(10)
+
+        self.assertLessEqual(latency, self.scheduler.worst_case_latency())
+        self.assertEqual(self.bus.commands(), [(Load.CMD_READ_VALUES, 1), (Load.CMD_LOAD_STATE, 0),
+                                               (Load.CMD_READ_VALUES, 2), (Load.CMD_READ_VALUES, 3)])
+
+    def test_safety_frame_drops_queued_polls(self):
+        self.scheduler = BusScheduler(self.bus, preempt=PREEMPT_DROP)
+        loads = [Load(address, self.scheduler, print_errors=False, lazy=True) for address in range(4)]
+        self.start_polling(loads[1])
+        wait_for(lambda: len(self.bus.writes) == 1)
+        self.start_polling(loads[2])
+        self.start_polling(loads[3])
+        time.sleep(0.05)
+
+        latency = self.load_off_latency(loads[0])
+
+        self.assertLessEqual(latency, self.scheduler.worst_case_latency())
+        self.assertEqual(self.scheduler.stats[PRIORITY_TELEMETRY].dropped, 2)
+        self.assertEqual(self.bus.commands(), [(Load.CMD_READ_VALUES, 1), (Load.CMD_LOAD_STATE, 0)])
+
+    def test_load_off_is_not_held_by_poll_of_same_load(self):
+        # Poll in another thread retries for 3 timeouts, load off waits for one transaction
+        self.scheduler = BusScheduler(self.bus, preempt=PREEMPT_DROP)
+        load = Load(0, self.scheduler, print_errors=False, lazy=True)
+        self.start_polling(load, retry_count=2)
+        wait_for(lambda: len(self.bus.writes) == 1)
+
+        latency = self.load_off_latency(load)
+
+        self.assertLessEqual(latency, self.scheduler.worst_case_latency())
+
+
+if __name__ == '__main__':
+    unittest.main()
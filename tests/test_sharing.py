@@ -0,0 +1,134 @@
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import struct
+import threading
+import time
+import unittest
+
+from array_devices.array3710 import Load
+from array_devices.sharing import BusServer, RemoteSerial
+
+
+def wait_for(condition, timeout=5.0):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.005)
+
+
+class FakeBus(object):
+    """
+    Serial connection answering 0x91 with a frame holding the address and
+    a counter of status frames on the wire, so every poll is distinct.
+    Reads can be held until released, to line up client requests.
+    """
+
+    def __init__(self):
+        self.polls = 0
+        self.written = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.read_delay = 0.0
+        self.__response = b''
+
+    def write(self, data_str):
+        data_str = bytes(data_str)
+        if bytearray(data_str)[2] == Load.CMD_READ_VALUES:
+            self.polls += 1
+            frame = bytearray(Load.FRAME_LENGTH)
+            struct.pack_into(b'< 3B H', frame, 0, 0xAA, bytearray(data_str)[1], Load.CMD_READ_VALUES, self.polls)
+            frame[-1] = sum(frame[:-1]) % 256
+            self.__response = bytes(frame)
+        self.written.set()
+        return len(data_str)
+
+    def read(self, length=1):
+        self.release.wait()
+        if self.read_delay:
+            time.sleep(self.read_delay)
+        response, self.__response = self.__response[:length], self.__response[length:]
+        return response
+
+
+def status_frame(address):
+    return Load.build_frame(address, Load.CMD_READ_VALUES)
+
+
+class SharingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = FakeBus()
+        self.server = BusServer(self.bus, ('127.0.0.1', 0))
+        self.server.start()
+        self.clients = []
+
+    def tearDown(self):
+        self.bus.release.set()
+        for client in self.clients:
+            client.close()
+        self.server.close()
+
+    def client(self, timeout=5.0):
+        client = RemoteSerial(self.server.address, timeout=timeout)
+        self.clients.append(client)
+        return client
+
+    def test_identical_status_requests_are_merged(self):
+        results = {}
+
+        def poll(name, client, address):
+            client.write(status_frame(address))
+            results[name] = client.read(Load.FRAME_LENGTH)
+
+        shared_bus = self.server.buses[0]
+        self.bus.release.clear()
+        first = threading.Thread(target=poll, args=('first', self.client(), 1))
+        first.start()
+        # First poll is on the wire, requests arriving now wait behind it
+        # and identical ones are merged into one fresh poll.
+        self.bus.written.wait(5)
+        threads = [threading.Thread(target=poll, args=(name, self.client(), address))
+                   for name, address in (('second', 1), ('third', 1), ('other', 2))]
+        for thread in threads:
+            thread.start()
+        wait_for(lambda: shared_bus.merged_count == 1)
+        self.bus.release.set()
+        for thread in [first] + threads:
+            thread.join(5)
+
+        self.assertEqual(shared_bus.merged_count, 1)
+        self.assertEqual(shared_bus.transaction_count, 3)
+        self.assertEqual(self.bus.polls, 3)
+        # Merged clients got the same reply, from a poll after the one in progress.
+        self.assertEqual(results['second'], results['third'])
+        self.assertEqual(bytearray(results['first'])[1], 1)
+        self.assertEqual(bytearray(results['second'])[1], 1)
+        self.assertEqual(struct.unpack_from(b'< H', results['first'], 3)[0], 1)
+        self.assertNotEqual(struct.unpack_from(b'< H', results['second'], 3)[0], 1)
+        # Other address got its own poll.
+        self.assertEqual(bytearray(results['other'])[1], 2)
+        self.assertNotEqual(struct.unpack_from(b'< H', results['other'], 3)[0],
+                            struct.unpack_from(b'< H', results['second'], 3)[0])
+
+    def test_late_reply_is_not_given_to_next_request(self):
+        client = self.client(timeout=0.2)
+        self.bus.read_delay = 0.5
+        self.assertRaises(IOError, client.write, status_frame(1))
+        self.bus.read_delay = 0.0
+        # Late reply arrives while no request is waiting
+        time.sleep(0.5)
+        client.write(status_frame(2))
+        response = client.read(Load.FRAME_LENGTH)
+        self.assertEqual(bytearray(response)[1], 2)
+        self.assertEqual(client.stale_replies, 1)
+
+    def test_remote_load_reads_status(self):
+        load = Load(3, self.client())
+        self.assertEqual(load.status.current, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
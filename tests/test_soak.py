@@ -0,0 +1,83 @@
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import unittest
+
+from array_devices.array3710 import Load
+from array_devices.soak import Burst, SoakLog, SoakRunner
+
+
+class FakeBus(object):
+    """
+    One load answering 0x91 with the max current and max power it was set to.
+    """
+
+    def __init__(self, address=0, apply_parameters=True):
+        self.address = address
+        self.apply_parameters = apply_parameters
+        self.max_current = 30000
+        self.max_power = 2000
+        self.__response = b''
+
+    def write(self, data_str):
+        data_str = bytes(data_str)
+        command = bytearray(data_str)[2]
+        if command == Load.CMD_SET_PARAMETERS and self.apply_parameters:
+            self.max_current, self.max_power = Load.STRUCT_SET_PARAMETERS.unpack_from(
+                data_str, Load.OFFSET_PAYLOAD)[:2]
+        elif command == Load.CMD_READ_VALUES:
+            self.__response = Load.build_frame(self.address, Load.CMD_READ_VALUES, lambda out_buffer:
+                                               Load.STRUCT_READ_VALUES_IN.pack_into(
+                                                   out_buffer, 0, 0xAA, self.address, Load.CMD_READ_VALUES,
+                                                   1000, 12000, 120, self.max_current, self.max_power,
+                                                   1200, 0, 0))
+        return len(data_str)
+
+    def read(self, length=1):
+        response, self.__response = self.__response[:length], self.__response[length:]
+        return response
+
+
+class SoakLogTest(unittest.TestCase):
+
+    def test_report_with_entries_out_of_time_order(self):
+        # Bus 1 command logged after a later command of bus 0
+        log = SoakLog()
+        log.add(0.0, 0.1, Load.CMD_READ_VALUES, 0, False, bus=0)
+        log.add(2.5, 0.1, Load.CMD_READ_VALUES, 0, True, bus=0)
+        log.add(1.0, 0.1, Load.CMD_READ_VALUES, 0, False, bus=1)
+        self.assertEqual(log.error_rate_over_time(1.0), [(0.0, 1, 0), (1.0, 1, 0), (2.0, 1, 1)])
+        self.assertAlmostEqual(log.elapsed, 2.6)
+        self.assertIn("Failures: 1", log.report(1.0))
+
+    def test_bursts_are_found_per_bus(self):
+        log = SoakLog()
+        for ind in range(3):
+            log.add(ind, 0.25, Load.CMD_READ_VALUES, 0, True, bus=0)
+            log.add(ind + 0.5, 0.25, Load.CMD_READ_VALUES, 0, False, bus=1)
+        self.assertEqual(log.bursts(), [Burst(0, 2.25, 3)])
+        stats = log.clustering()
+        self.assertEqual(stats['failure_after_failure'], 1.0)
+        self.assertEqual(stats['longest_burst'], 3)
+        self.assertEqual(log.error_rate(), 0.5)
+
+
+class SoakRunnerTest(unittest.TestCase):
+
+    def test_applied_parameters_pass_and_max_power_is_restored(self):
+        bus = FakeBus()
+        load = Load(0, bus, print_errors=False, lazy=True)
+        log = SoakRunner([load], mix={Load.CMD_SET_PARAMETERS: 1}, seed=1).run(max_commands=4)
+        self.assertEqual(list(log.commands), [Load.CMD_SET_PARAMETERS, Load.CMD_READ_VALUES] * 4)
+        self.assertEqual(log.failure_count, 0)
+        self.assertEqual(bus.max_power, 2000)
+
+    def test_lost_parameters_fail(self):
+        load = Load(0, FakeBus(apply_parameters=False), print_errors=False, lazy=True)
+        log = SoakRunner([load], mix={Load.CMD_SET_PARAMETERS: 1}, seed=1).run(max_commands=4)
+        self.assertEqual(list(log.failures), [1, 0] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()